@@ -2,6 +2,8 @@
 This is database connection module
 """
 
+from loguru import logger
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
@@ -13,3 +15,30 @@ asmi_async_session_maker = async_sessionmaker(asmi_engine, expire_on_commit=Fals
 
 class Base(DeclarativeBase):
     pass
+
+
+# Индексы, которые нужны запросам API, но отсутствуют в исходной схеме базы.
+# Строятся CONCURRENTLY, чтобы не блокировать запись новостей сборщиком на время построения.
+INDEXES = {
+    # Постраничный обход новостей без эмбеддингов по (date, url) в ServicesDao.get_missing_embs
+    'news_date_url_idx': 'CREATE INDEX CONCURRENTLY IF NOT EXISTS news_date_url_idx ON news (date, url)',
+}
+
+
+async def ensure_indexes():
+    """
+    Создаёт недостающие индексы при старте API; прерванное построение (индекс INVALID) повторяется.
+    Creates missing indexes on API startup; an interrupted build (an INVALID index) is redone.
+    """
+    async with asmi_engine.connect() as conn:
+        # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        for name, ddl in INDEXES.items():
+            invalid = await conn.scalar(text("""
+                SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = :name
+            """), {'name': name})
+            if invalid:
+                logger.warning(f'Индекс {name} не достроен, построение повторяется')
+                await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+            await conn.execute(text(ddl))
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import FileResponse
 import os
@@ -10,8 +11,17 @@ from api.graphs.router import router as router_graphs
 from api.services.router import router as router_services
 from api.crud.router import router as router_crud
 from api.models.router import router as router_models
+from api.db import ensure_indexes
 
-app = FastAPI(title='AntiSMI API')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Индексы, на которые опираются запросы API, создаются при старте, если их нет
+    await ensure_indexes()
+    yield
+
+
+app = FastAPI(title='AntiSMI API', lifespan=lifespan)
 
 
 @app.get("/", tags=["Home"])
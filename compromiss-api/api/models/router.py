@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from api.models.services import headliner, summarizer, categorizer, embedder
+from api.models.services import headliner, summarizer, categorizer, embedder, model_names
 
 router = APIRouter(
     prefix='/models',
@@ -8,6 +8,12 @@ router = APIRouter(
 )
 
 
+@router.get('/info')
+async def get_models_info() -> dict[str, str]:
+    """Идентификаторы моделей, которые обслуживают эндпоинты этого роутера."""
+    return model_names
+
+
 @router.post('/generate_embs')
 async def make_emb(query: list[str]) -> list[list[float]]:
     """Handler to fetch most simular news to transferable query over a period of time"""
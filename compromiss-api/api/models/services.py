@@ -115,6 +115,14 @@ class SummaryModel(ModelInterface):
             summaries.append(summary)
         return summaries
 
+# Идентификаторы моделей по назначению: клиенты включают их в ключи своих кэшей
+model_names = {
+    'embedding': embedding_model_name,
+    'category': category_model_name,
+    'headline': headline_model_name,
+    'summary': summary_model_name,
+}
+
 # Инициализация моделей
 embedder = EmbeddingModel(embedding_model, embedding_tokenizer, device)
 categorizer = CategoryModel(category_model, category_tokenizer, device, id2label)
@@ -1,4 +1,4 @@
-from sqlalchemy import String, DateTime, ForeignKey, ARRAY
+from sqlalchemy import String, DateTime, ForeignKey, ARRAY, Index
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 from pgvector.sqlalchemy import Vector
 from datetime import datetime
@@ -40,6 +40,9 @@ class BackendView(Base):
 # Модель для таблицы News
 class News(Base):
     __tablename__ = 'news'
+    # Первичный ключ — (url, date); постраничный обход по (date, url) в ServicesDao.get_missing_embs
+    # опирается на этот индекс, его создаёт api.db.ensure_indexes при старте API
+    __table_args__ = (Index('news_date_url_idx', 'date', 'url'),)
 
     url: Mapped[str] = mapped_column(primary_key=True)
     date: Mapped[datetime] = mapped_column(primary_key=True, nullable=False)
@@ -1,29 +1,44 @@
-from api.news.models import News, Embs, Agencies, Categories, NewsView
+from datetime import datetime
+
+from api.news.models import News, Embs, NewsView
 from api.dao.base import BaseDao
 from api.db import asmi_async_session_maker
 
-from sqlalchemy import select
+from sqlalchemy import func, select, tuple_
 
 
 class ServicesDao(BaseDao):
     model = NewsView
 
     @staticmethod
-    async def get_missing_embs(**filter_by):
-        """Picks up news between two daytime values using filter"""
+    def _missing_embs_query(*columns):
+        """News rows without a matching (url, date) row in embs"""
+        return (
+            select(*columns)
+            .select_from(News)
+            .outerjoin(Embs, (News.url == Embs.url) & (News.date == Embs.date))
+            .where(Embs.url == None)
+        )
+
+    @staticmethod
+    async def get_missing_embs(limit: int, after_date: datetime | None = None, after_url: str | None = None):
+        """
+        Picks up one page of news without embeddings ordered by (date, url), starting after the given key.
+        The primary key of news is (url, date), so keyset pagination relies on the news_date_url_idx index
+        on (date, url) that api.db.ensure_indexes creates on API startup: with it every page is an index
+        range scan, however deep the backlog is.
+        """
         async with asmi_async_session_maker() as session:
-            query = (
-                select(
-                    News.url,
-                    News.date,
-                    Embs.embedding,
-                    Agencies.telegram,
-                    Categories.category
-                )
-                .outerjoin(Embs, News.url == Embs.url)
-                .join(Agencies, News.agency_id == Agencies.id)
-                .join(Categories, News.category_id == Categories.id)
-                .where(Embs.embedding == None)
-            )
+            query = ServicesDao._missing_embs_query(News.url, News.date, News.news)
+            if after_date is not None:
+                query = query.where(tuple_(News.date, News.url) > tuple_(after_date, after_url or ''))
+            query = query.order_by(News.date, News.url).limit(limit)
             result = await session.execute(query)
             return result.mappings().all()
+
+    @staticmethod
+    async def count_missing_embs() -> int:
+        """Counts news without embeddings"""
+        async with asmi_async_session_maker() as session:
+            query = ServicesDao._missing_embs_query(func.count())
+            return await session.scalar(query)
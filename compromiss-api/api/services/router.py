@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Request
+from datetime import datetime
+
+from fastapi import APIRouter, Query, Request
 
 from api.news.dao import NewsDao
-from api.news.schemas import BackendViewSchema, NewsSchema
+from api.news.schemas import BackendViewSchema
 from api.services.dao import ServicesDao
+from api.services.schemas import CleanTextSchema, MissingEmbSchema
 from api.news.services import TextCleaner
 
 router = APIRouter(
@@ -10,6 +13,8 @@ router = APIRouter(
     tags=['Services'],
 )
 
+text_cleaner = TextCleaner()
+
 
 @router.post('/embs_search')
 async def news_search_via_emb(embedding: list[float], limit: int = 50) -> list[BackendViewSchema]:
@@ -17,9 +22,22 @@ async def news_search_via_emb(embedding: list[float], limit: int = 50) -> list[B
 
 
 @router.post('/get_missing_embs')
-async def write_missing() -> list[NewsSchema]:
-    return await ServicesDao.get_all(embedding=None)
-    # return await ServicesDao.get_missing_embs()
+async def write_missing(
+        after_date: datetime | None = Query(default=None),
+        after_url: str | None = Query(default=None),
+        limit: int = Query(default=500, ge=1, le=5000)
+) -> list[MissingEmbSchema]:
+    """
+    Handler to page through news without embeddings ordered by (date, url):
+    pass the date and url of the last row of a page to get the next one
+    """
+    return await ServicesDao.get_missing_embs(limit=limit, after_date=after_date, after_url=after_url)
+
+
+@router.get('/count_missing_embs')
+async def count_missing() -> dict[str, int]:
+    """Handler to report how many news still lack embeddings"""
+    return {"missing": await ServicesDao.count_missing_embs()}
 
 
 @router.post('/clean_text')
@@ -29,7 +47,12 @@ async def clean_news_text(request: Request):
     text = data.get('text')
     agency = data.get('agency')
 
-    cleaner = TextCleaner()
-    clean_text = cleaner.clean_news(text) if not agency else cleaner.clean_news(news=text, channel=agency)
+    clean_text = text_cleaner.clean_news(text) if not agency else text_cleaner.clean_news(news=text, channel=agency)
 
     return {"clean_text": clean_text}
+
+
+@router.post('/clean_text_batch')
+async def clean_news_text_batch(texts: list[CleanTextSchema]) -> dict[str, list[str]]:
+    """Handler to clean a batch of news texts in one request, preserving their order"""
+    return {"clean_texts": [text_cleaner.clean_news(news=item.text, channel=item.agency) for item in texts]}
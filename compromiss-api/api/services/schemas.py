@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class CleanTextSchema(BaseModel):
+    text: str
+    agency: str | None = None
+
+
+class MissingEmbSchema(BaseModel):
+    url: str
+    date: datetime
+    news: str
@@ -1,16 +1,43 @@
 import aiohttp
-from typing import Any
+import asyncio
+import numpy as np
+import time
+from datetime import datetime
+from typing import Any, Optional
 import os
-from api.services import get_headline_model, get_summary_model
+from loguru import logger
+from api.executor import InferenceExecutor
+from api.registry import registry
+from monitoring.metrics import CLEAN_SECONDS, CLEAN_TEXTS, GENERATION_REQUESTS, MODEL_TOKENS
 
 API_URL = os.getenv("API")
 
+# Где генерируются заголовки и резюме: local — модели в процессе сборщика, remote — эндпоинты API,
+# auto — API с переходом на локальные модели при таймауте или ошибке
+GENERATION_BACKEND = os.getenv("GENERATION_BACKEND", "local")
+# Размер пакета одного запроса к API генерации и таймаут такого запроса в секундах
+GENERATION_BATCH_SIZE = int(os.getenv("GENERATION_BATCH_SIZE", 16))
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", 300))
+
+# Эндпоинты API с теми же моделями, что и локальные
+GENERATION_ENDPOINTS = {'summary': 'generate_resumes', 'headline': 'generate_headlines'}
+GENERATION_BACKENDS = ('local', 'remote', 'auto')
+
 
 class NewsAPIClient:
-    def __init__(self, base_url: str = API_URL):
+    def __init__(self, base_url: str = API_URL, executor: Optional[InferenceExecutor] = None,
+                 generation_backend: str = GENERATION_BACKEND, generation_batch_size: int = GENERATION_BATCH_SIZE,
+                 generation_timeout: float = GENERATION_TIMEOUT):
+        if generation_backend not in GENERATION_BACKENDS:
+            raise ValueError(f'Неизвестный бэкенд генерации: {generation_backend}')
         self.base_url = base_url
         self.timeout = aiohttp.ClientTimeout(total=36000)
         self.session = None
+        self.executor = executor
+        self.generation_backend = generation_backend
+        self.generation_batch_size = max(generation_batch_size, 1)
+        self.generation_timeout = aiohttp.ClientTimeout(total=generation_timeout)
+        self._model_ids: Optional[dict[str, str]] = None
 
 
     async def __aenter__(self):
@@ -22,14 +49,56 @@ class NewsAPIClient:
             await self.session.close()
 
 
-    async def fetch_news_without_embeddings(self) -> dict[str, Any]:
+    async def fetch_news_without_embeddings(self, limit: int, after_date: Optional[datetime] = None,
+                                            after_url: Optional[str] = None) -> list[dict[str, Any]]:
         """
-        Получает новости без эмбеддингов.
-        Fetches news without embeddings.
+        Получает страницу новостей без эмбеддингов, упорядоченных по (date, url), после указанного ключа.
+        Fetches a page of news without embeddings ordered by (date, url), after the given key.
         """
-        async with self.session.post(f"{self.base_url}/services/get_missing_embs") as response:
+        params = {'limit': limit}
+        if after_date is not None:
+            params.update(after_date=after_date.isoformat(), after_url=after_url or '')
+        async with self.session.post(f"{self.base_url}/services/get_missing_embs", params=params) as response:
+            response.raise_for_status()
             return await response.json()
 
+    async def count_news_without_embeddings(self) -> int:
+        """
+        Число новостей без эмбеддингов.
+        Number of news without embeddings.
+        """
+        async with self.session.get(f"{self.base_url}/services/count_missing_embs") as response:
+            response.raise_for_status()
+            return (await response.json())['missing']
+
+    async def model_ids(self) -> dict[str, str]:
+        """
+        Идентификаторы моделей обогащения по назначению (embedding, category, summary, headline)
+        вместе с тем, где и каким бэкендом они выполняются; входят в ключ кэша обогащения.
+        Identifiers of the enrichment models by purpose (embedding, category, summary, headline)
+        together with where and with which backend they run; they are part of the enrichment cache key.
+        """
+        if self._model_ids is not None:
+            return self._model_ids
+        try:
+            async with self.session.get(f"{self.base_url}/models/info") as response:
+                response.raise_for_status()
+                remote = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Без описания моделей API результаты кэшируются под именами эндпоинтов; запасные
+            # идентификаторы не запоминаются, и следующий вызов снова запрашивает /models/info
+            logger.warning(f'Не удалось получить описание моделей API: {e!r}')
+            remote = None
+        ids = {model: f'api:{(remote or {}).get(model, model)}'
+               for model in ('embedding', 'category', *GENERATION_ENDPOINTS)}
+        if self.generation_backend == 'local':
+            from api.services import HEADLINE_BACKEND, HEADLINE_MODEL_NAME, SUMMARY_BACKEND, SUMMARY_MODEL_NAME
+            ids['summary'] = f'local:{SUMMARY_MODEL_NAME}:{SUMMARY_BACKEND}'
+            ids['headline'] = f'local:{HEADLINE_MODEL_NAME}:{HEADLINE_BACKEND}'
+        if remote is not None:
+            self._model_ids = ids
+        return ids
+
     async def clean_text(self, text: str, agency: str = None) -> str:
         """
         Очищает текст новости.
@@ -44,13 +113,28 @@ class NewsAPIClient:
                 return result.get('clean_text', text)
             return text
 
-    async def generate_embs(self, news_list: list[str]) -> list[list[float]]:
+    async def clean_texts(self, texts: list[str], agency: str = None) -> list[str]:
+        """
+        Очищает тексты новостей одним запросом.
+        Cleans a batch of news texts in a single request.
+        """
+        if not texts:
+            return []
+        data = [{'text': text, 'agency': agency} for text in texts]
+        CLEAN_TEXTS.inc(len(texts))
+        started = time.perf_counter()
+        async with self.session.post(f"{self.base_url}/services/clean_text_batch", json=data) as response:
+            result = await response.json() if response.status == 200 else {}
+        CLEAN_SECONDS.labels(str(response.status)).observe(time.perf_counter() - started)
+        return result.get('clean_texts', texts)
+
+    async def generate_embs(self, news_list: list[str]) -> np.ndarray:
         """
-        Генерирует эмбеддинги для списка новостей.
-        Generates embeddings for a list of news.
+        Генерирует эмбеддинги для списка новостей: один массив float32 на пакет, строки — эмбеддинги новостей.
+        Generates embeddings for a list of news: one float32 array per batch, one row per news item.
         """
         async with self.session.post(f"{self.base_url}/models/generate_embs", json=news_list) as response:
-            return await response.json()
+            return np.asarray(await response.json(), dtype=np.float32)
 
     async def get_category(self, news: list[str]) -> list[str]:
         """
@@ -60,18 +144,71 @@ class NewsAPIClient:
         async with self.session.post(f"{self.base_url}/models/get_category", json=news) as response:
             return await response.json()
 
-    def generate_resumes(self, news: list[str]) -> list[str]:
+    async def _run_model(self, model_name: str, news: list[str]) -> list[str]:
+        """
+        Запускает локальную модель в пуле инференса, не блокируя цикл событий.
+        Runs a local model in the inference pool without blocking the event loop.
+        """
+        if self.executor:
+            results, usage = await self.executor.process(model_name, news)
+        else:
+            # Модели регистрируются при первом локальном вызове: в режиме remote transformers не импортируется
+            import api.services  # noqa: F401
+            usage = {'input_tokens': 0, 'output_tokens': 0}
+            results = await asyncio.to_thread(registry.get(model_name).process, news, usage)
+        MODEL_TOKENS.labels(model_name, 'input').inc(usage['input_tokens'])
+        MODEL_TOKENS.labels(model_name, 'output').inc(usage['output_tokens'])
+        return results
+
+    async def _request_model(self, model_name: str, news: list[str]) -> list[str]:
+        """
+        Вызывает эндпоинт генерации API для одного пакета новостей.
+        Calls the API generation endpoint for a single batch of news.
+        """
+        url = f"{self.base_url}/models/{GENERATION_ENDPOINTS[model_name]}"
+        async with self.session.post(url, json=news, timeout=self.generation_timeout) as response:
+            response.raise_for_status()
+            results = await response.json()
+        if len(results) != len(news):
+            raise ValueError(f'API вернул {len(results)} результатов модели {model_name} на {len(news)} новостей')
+        return results
+
+    async def _generate(self, model_name: str, news: list[str]) -> list[str]:
+        """
+        Генерирует тексты выбранным бэкендом. Удалённо новости отправляются пакетами по generation_batch_size;
+        в режиме auto пакет, на котором API не ответил вовремя или вернул ошибку, генерируется локально.
+        Generates texts with the selected backend. Remotely the news are sent in batches of generation_batch_size;
+        in auto mode a batch the API failed or timed out on is generated locally.
+        """
+        if self.generation_backend == 'local' or not news:
+            return await self._run_model(model_name, news)
+
+        results = []
+        for start in range(0, len(news), self.generation_batch_size):
+            batch = news[start:start + self.generation_batch_size]
+            try:
+                results.extend(await self._request_model(model_name, batch))
+                GENERATION_REQUESTS.labels(model_name, 'remote').inc()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                if self.generation_backend == 'remote':
+                    GENERATION_REQUESTS.labels(model_name, 'error').inc()
+                    raise
+                GENERATION_REQUESTS.labels(model_name, 'fallback').inc()
+                logger.warning(f'API генерации ({model_name}) недоступен: {e!r}, пакет из {len(batch)} новостей '
+                               f'обрабатывается локально')
+                results.extend(await self._run_model(model_name, batch))
+        return results
+
+    async def generate_resumes(self, news: list[str]) -> list[str]:
         """
         Генерирует резюме для списка новостей.
         Generates summaries for a list of news.
         """
-        result = get_summary_model().process(news)
-        return result
+        return await self._generate('summary', news)
 
-    def generate_headlines(self, news: list[str]) -> list[str]:
+    async def generate_headlines(self, news: list[str]) -> list[str]:
         """
         Генерирует заголовки для списка новостей.
         Generates headlines for a list of news.
         """
-        result = get_headline_model().process(news)
-        return result
+        return await self._generate('headline', news)
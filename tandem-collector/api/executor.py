@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Optional
+from loguru import logger
+
+from api.registry import registry
+
+# Тип пула (thread | process), число воркеров и потоков torch на воркер (0 — значение torch по умолчанию)
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 1))
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", 0))
+
+GENERATION_MODELS = ('summary', 'headline')
+
+
+def _init_worker(torch_threads: int, preload: Iterable[str]):
+    """
+    Настраивает воркер: число потоков torch и предварительная загрузка моделей.
+    Configures a worker: torch thread count and model preloading.
+    """
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+    import api.services  # noqa: F401 регистрирует модели в реестре процесса воркера
+    registry.warm_up(preload)
+
+
+def _process(model_name: str, texts: list[str]) -> tuple[list[str], dict[str, int]]:
+    import api.services  # noqa: F401
+    usage = {'input_tokens': 0, 'output_tokens': 0}
+    return registry.get(model_name).process(texts, usage), usage
+
+
+class InferenceExecutor:
+    """
+    Пул для синхронного инференса моделей вне цикла событий.
+    Pool that runs synchronous model inference off the event loop.
+
+    В режиме thread модели общие для всех потоков процесса, в режиме process
+    каждый воркер загружает собственные копии моделей при старте.
+    In thread mode the models are shared by all threads of the process, in process mode
+    every worker loads its own copies of the models on startup.
+    """
+
+    def __init__(self, kind: str = INFERENCE_EXECUTOR, workers: int = INFERENCE_WORKERS,
+                 torch_threads: int = TORCH_THREADS):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f'Неизвестный тип пула инференса: {kind}')
+        self.kind = kind
+        self.workers = max(workers, 1)
+        self.torch_threads = torch_threads
+        self._pool: Optional[Executor] = None
+
+    def start(self):
+        if self.kind == 'process':
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.torch_threads, GENERATION_MODELS)
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix='inference',
+                initializer=_init_worker,
+                initargs=(self.torch_threads, ())
+            )
+        logger.info(f'Пул инференса: {self.kind}, воркеров {self.workers}, '
+                    f'потоков torch {self.torch_threads or "по умолчанию"}')
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.to_thread(self.shutdown)
+
+    async def process(self, model_name: str, texts: list[str]) -> tuple[list[str], dict[str, int]]:
+        """
+        Выполняет model.process(texts) в пуле и ожидает результат без блокировки цикла событий.
+        Runs model.process(texts) in the pool and awaits the result without blocking the event loop.
+
+        Вместе с результатами возвращает число входных и сгенерированных токенов.
+        Returns the number of input and generated tokens along with the results.
+        """
+        if not texts:
+            return [], {'input_tokens': 0, 'output_tokens': 0}
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _process, model_name, texts)
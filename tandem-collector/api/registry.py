@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional
+from loguru import logger
+
+# Модели, загружаемые при старте планировщика: "all" или имена через запятую
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "")
+
+
+class ModelRegistry:
+    """
+    Реестр моделей процесса: каждая модель загружается один раз при первом обращении
+    и живёт в памяти всё время работы планировщика.
+
+    Process-wide model registry: every model is loaded once on first access
+    and stays in memory for the life of the scheduler process.
+    """
+
+    def __init__(self):
+        self._loaders: dict[str, Callable[[], Any]] = {}
+        self._models: dict[str, Any] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self.load_seconds: dict[str, float] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """Регистрирует функцию загрузки модели под именем name."""
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str) -> Any:
+        """
+        Возвращает модель, загружая её при первом обращении.
+        Returns the model, loading it on first access.
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        # Блокировка на модель: параллельные потоки не загружают её дважды
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                started = time.perf_counter()
+                model = self._loaders[name]()
+                self.load_seconds[name] = time.perf_counter() - started
+                self._models[name] = model
+                logger.info(f'Модель {name} загружена за {self.load_seconds[name]:.1f} секунд')
+        return model
+
+    def warm_up(self, names: Optional[Iterable[str]] = None):
+        """
+        Заранее загружает указанные (или все зарегистрированные) модели.
+        Preloads the given (or all registered) models.
+        """
+        for name in names if names is not None else list(self._loaders):
+            self.get(name)
+
+    def warm_up_names(self, setting: str = MODEL_WARMUP) -> list[str]:
+        """Разбирает настройку MODEL_WARMUP в список имён моделей."""
+        if setting.strip().lower() == 'all':
+            return list(self._loaders)
+        return [name.strip() for name in setting.split(',') if name.strip()]
+
+
+registry = ModelRegistry()
@@ -1,8 +1,14 @@
-from typing import List, Any
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 from datetime import datetime
 from pydantic import BaseModel
 
+from api.registry import registry
+
 # Словарь для маппинга индексов на категории
 id2label = {
     0: 'climate', 1: 'conflicts', 2: 'culture', 3: 'economy', 4: 'gloss',
@@ -24,67 +30,155 @@ class NewsItem(BaseModel):
 
 device = "cpu"
 
+# Максимальная длина входа и бюджет токенов (длина самого длинного текста * размер пакета) на один пакет генерации
+MAX_INPUT_LENGTH = 600
+GENERATION_TOKEN_BUDGET = int(os.getenv("GENERATION_TOKEN_BUDGET", 8192))
+GENERATION_MAX_BATCH = int(os.getenv("GENERATION_MAX_BATCH", 32))
+
+
+# Бэкенд инференса моделей генерации: fp32 — PyTorch как есть, int8 — динамическая квантизация
+# линейных слоёв PyTorch, onnx — ONNX Runtime (нужен optimum[onnxruntime]); выбирается для каждой модели
+HEADLINE_BACKEND = os.getenv("HEADLINE_BACKEND", "fp32")
+SUMMARY_BACKEND = os.getenv("SUMMARY_BACKEND", "fp32")
+BACKENDS = ('fp32', 'int8', 'onnx')
+# Каталог экспортированных в ONNX моделей: экспорт выполняется один раз и переиспользуется
+ONNX_EXPORT_DIR = os.getenv("ONNX_EXPORT_DIR", "data/onnx")
+
+HEADLINE_MODEL_NAME = "IlyaGusev/rut5_base_headline_gen_telegram"
+SUMMARY_MODEL_NAME = "IlyaGusev/mbart_ru_sum_gazeta"
+
+
+def load_seq2seq(model_name: str, backend: str):
+    """
+    Загружает seq2seq-модель для указанного бэкенда; у всех бэкендов одинаковый метод generate.
+    Loads a seq2seq model for the given backend; every backend exposes the same generate method.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Неизвестный бэкенд инференса {backend!r}, допустимые значения: {", ".join(BACKENDS)}')
+
+    if backend == 'onnx':
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError as e:
+            raise ImportError('Для бэкенда onnx установите optimum[onnxruntime]') from e
+        export_dir = Path(ONNX_EXPORT_DIR) / model_name.replace('/', '--')
+        if export_dir.exists():
+            return ORTModelForSeq2SeqLM.from_pretrained(export_dir)
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+        # Воркеры пула процессов экспортируют одновременно: каждый сохраняет во временный соседний каталог
+        # и атомарно переименовывает его, поэтому export_dir появляется только целиком
+        export_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=export_dir.parent, prefix=f'.{export_dir.name}.')
+        try:
+            model.save_pretrained(tmp_dir)
+            os.replace(tmp_dir, export_dir)
+        except OSError:
+            # Другой воркер уже переименовал свой экспорт; если нет — это настоящая ошибка записи
+            if not export_dir.exists():
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return model
 
-def get_headline_model():
-    model_name = "IlyaGusev/rut5_base_headline_gen_telegram"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
     model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device)
-    return HeadlineModel(model=model, tokenizer=tokenizer, device=device)
+    if backend == 'int8':
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model.eval()
 
 
-def get_summary_model():
-    model_name = "IlyaGusev/mbart_ru_sum_gazeta"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device)
-    return SummaryModel(model=model, tokenizer=tokenizer, device=device)
+def get_headline_model(backend: str = HEADLINE_BACKEND):
+    tokenizer = AutoTokenizer.from_pretrained(HEADLINE_MODEL_NAME)
+    model = load_seq2seq(HEADLINE_MODEL_NAME, backend)
+    return HeadlineModel(model=model, tokenizer=tokenizer, device=device, backend=backend)
+
+
+def get_summary_model(backend: str = SUMMARY_BACKEND):
+    tokenizer = AutoTokenizer.from_pretrained(SUMMARY_MODEL_NAME)
+    model = load_seq2seq(SUMMARY_MODEL_NAME, backend)
+    return SummaryModel(model=model, tokenizer=tokenizer, device=device, backend=backend)
 
 
 class ModelInterface:
-    def __init__(self, model, tokenizer, device):
+    def __init__(self, model, tokenizer, device, backend: str = 'fp32',
+                 token_budget: int = GENERATION_TOKEN_BUDGET, max_batch: int = GENERATION_MAX_BATCH):
         self.model = model
         self.tokenizer = tokenizer
         self.device = device
+        self.backend = backend
+        self.token_budget = token_budget
+        self.max_batch = max_batch
 
-    def process(self, texts: List[str]) -> List[Any]:
+    def process(self, texts: List[str], usage: Optional[Dict[str, int]] = None) -> List[Any]:
         raise NotImplementedError
 
-
-class HeadlineModel(ModelInterface):
-    def process(self, texts: List[str]) -> List[str]:
-        titles = []
-        for text in texts:
-            input_ids = self.tokenizer(
-                [text],
-                max_length=600,
-                add_special_tokens=True,
-                padding="max_length",
-                truncation=True,
+    def length_buckets(self, encodings: List[List[int]]) -> List[List[int]]:
+        """
+        Группирует индексы текстов, отсортированных по длине, в пакеты в пределах бюджета токенов.
+        Groups length-sorted text indices into batches that fit the token budget.
+        """
+        buckets, bucket = [], []
+        for i in sorted(range(len(encodings)), key=lambda i: len(encodings[i])):
+            # Тексты идут по возрастанию длины, поэтому текущий — самый длинный в пакете
+            padded_size = len(encodings[i]) * (len(bucket) + 1)
+            if bucket and (padded_size > self.token_budget or len(bucket) >= self.max_batch):
+                buckets.append(bucket)
+                bucket = []
+            bucket.append(i)
+        if bucket:
+            buckets.append(bucket)
+        return buckets
+
+    def generate_batched(self, texts: List[str], usage: Optional[Dict[str, int]] = None,
+                         **generate_kwargs) -> List[str]:
+        """
+        Генерирует тексты пакетами с динамическим паддингом и возвращает их в исходном порядке.
+        Generates texts in dynamically padded batches and returns them in the original order.
+
+        В usage, если он передан, добавляется число входных и сгенерированных токенов.
+        If usage is given, the number of input and generated tokens is added to it.
+        """
+        if not texts:
+            return []
+        encodings = self.tokenizer(
+            texts,
+            max_length=MAX_INPUT_LENGTH,
+            add_special_tokens=True,
+            truncation=True
+        )["input_ids"]
+
+        results = [""] * len(texts)
+        for bucket in self.length_buckets(encodings):
+            batch = self.tokenizer.pad(
+                {"input_ids": [encodings[i] for i in bucket]},
+                padding=True,
                 return_tensors="pt"
-            )["input_ids"].to(self.device)
+            ).to(self.device)
+
+            output_ids = self.model.generate(
+                input_ids=batch["input_ids"],
+                attention_mask=batch["attention_mask"],
+                **generate_kwargs
+            )
+            for i, output in zip(bucket, output_ids):
+                results[i] = self.tokenizer.decode(output, skip_special_tokens=True)
+            if usage is not None:
+                usage['input_tokens'] = usage.get('input_tokens', 0) + int(batch["attention_mask"].sum())
+                usage['output_tokens'] = usage.get('output_tokens', 0) + int(
+                    (output_ids != self.tokenizer.pad_token_id).sum())
+        return results
 
-            output_ids = self.model.generate(input_ids=input_ids)[0]
-            headline = self.tokenizer.decode(output_ids, skip_special_tokens=True)
-            titles.append(headline)
-        return titles
+
+class HeadlineModel(ModelInterface):
+    def process(self, texts: List[str], usage: Optional[Dict[str, int]] = None) -> List[str]:
+        return self.generate_batched(texts, usage)
 
 
 class SummaryModel(ModelInterface):
-    def process(self, texts: List[str]) -> List[str]:
-        summaries = []
-        for text in texts:
-            input_ids = self.tokenizer(
-                [text],
-                max_length=600,
-                padding="max_length",
-                truncation=True,
-                return_tensors="pt",
-            )["input_ids"].to(self.device)
+    def process(self, texts: List[str], usage: Optional[Dict[str, int]] = None) -> List[str]:
+        return self.generate_batched(texts, usage, no_repeat_ngram_size=4)
 
-            output_ids = self.model.generate(
-                input_ids=input_ids,
-                no_repeat_ngram_size=4
-            )[0]
 
-            summary = self.tokenizer.decode(output_ids, skip_special_tokens=True)
-            summaries.append(summary)
-        return summaries
+# Модели загружаются один раз на процесс при первом обращении через реестр
+registry.register('headline', get_headline_model)
+registry.register('summary', get_summary_model)
@@ -0,0 +1,92 @@
+"""
+Сравнение бэкендов инференса моделей генерации (fp32, int8, onnx) по скорости на CPU
+и по близости результатов к fp32 (ROUGE-1/2/L F1 на фикстурах).
+Comparison of generation model inference backends (fp32, int8, onnx) by CPU speed
+and by closeness of the results to fp32 (ROUGE-1/2/L F1 on the fixtures).
+
+Запуск из каталога tandem-collector | Run from the tandem-collector directory:
+    python -m benchmarks.backends --model summary --backends fp32 int8 onnx --repeat 3
+"""
+import argparse
+import time
+from collections import Counter
+
+from api.services import BACKENDS, get_headline_model, get_summary_model
+from benchmarks.common import timed
+from benchmarks.generation import load_texts
+
+LOADERS = {'headline': get_headline_model, 'summary': get_summary_model}
+
+
+def ngrams(tokens: list[str], n: int) -> Counter:
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def f1(overlap: int, candidate: int, reference: int) -> float:
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / candidate, overlap / reference
+    return 2 * precision * recall / (precision + recall)
+
+
+def lcs_length(a: list[str], b: list[str]) -> int:
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = 0
+        for j, y in enumerate(b, 1):
+            previous, row[j] = row[j], previous + 1 if x == y else max(row[j], row[j - 1])
+    return row[-1]
+
+
+def rouge(candidate: str, reference: str) -> dict[str, float]:
+    """ROUGE-1, ROUGE-2 и ROUGE-L (F1) по словам в нижнем регистре."""
+    cand, ref = candidate.lower().split(), reference.lower().split()
+    scores = {}
+    for n in (1, 2):
+        cand_ngrams, ref_ngrams = ngrams(cand, n), ngrams(ref, n)
+        scores[f'rouge{n}'] = f1(sum((cand_ngrams & ref_ngrams).values()),
+                                 sum(cand_ngrams.values()), sum(ref_ngrams.values()))
+    scores['rougeL'] = f1(lcs_length(cand, ref), len(cand), len(ref))
+    return scores
+
+
+def mean_rouge(candidates: list[str], references: list[str]) -> dict[str, float]:
+    totals = Counter()
+    for candidate, reference in zip(candidates, references):
+        totals.update(rouge(candidate, reference))
+    return {name: value / len(references) for name, value in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', choices=list(LOADERS), default='headline')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--limit', type=int, default=None)
+    args = parser.parse_args()
+
+    texts = load_texts(limit=args.limit)
+    print(f'model: {args.model}, texts: {len(texts)}')
+
+    reference, reference_seconds = None, None
+    # fp32 всегда считается первым: это эталон для ROUGE и для ускорения
+    for backend in ['fp32'] + [backend for backend in args.backends if backend != 'fp32']:
+        started = time.perf_counter()
+        model = LOADERS[args.model](backend)
+        load_seconds = time.perf_counter() - started
+        seconds, results = timed(lambda model=model: model.process(texts), args.repeat)
+        del model
+
+        line = f'{backend:<5} load {load_seconds:6.1f} s, generate {seconds:7.2f} s ({len(texts) / seconds:.2f} texts/s)'
+        if reference is None:
+            reference, reference_seconds = results, seconds
+        else:
+            scores = mean_rouge(results, reference)
+            same = sum(a == b for a, b in zip(results, reference))
+            line += (f', speedup x{reference_seconds / seconds:.2f}, identical {same}/{len(texts)}, '
+                     + ', '.join(f'{name} {value:.3f}' for name, value in scores.items()))
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
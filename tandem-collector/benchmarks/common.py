@@ -0,0 +1,16 @@
+"""
+Общие помощники бенчмарков без зависимостей от моделей: их можно запускать и в образе без transformers.
+Shared benchmark helpers with no model dependencies: they also run in an image without transformers.
+"""
+import time
+from typing import Any, Callable
+
+
+def timed(func: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    """Лучшее время из repeat вызовов func и результат последнего вызова."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
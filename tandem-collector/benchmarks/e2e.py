@@ -0,0 +1,252 @@
+"""
+Офлайн-бенчмарк NewsProcessor.process_agencies: страницы t.me из фикстур и API-сервисы отдаёт локальная
+заглушка на aiohttp с настраиваемой задержкой, новости пишутся в память или в одноразовую базу Postgres.
+Offline benchmark of NewsProcessor.process_agencies: t.me pages from fixtures and the API services are served
+by a local aiohttp stub with configurable latency, news are written to memory or to a disposable Postgres.
+
+Запуск из каталога tandem-collector | Run from the tandem-collector directory:
+    python -m benchmarks.e2e --agencies 30 --api-latency 50 --model-latency 20
+    python -m benchmarks.e2e --sink postgres   # переменные DB_* указывают на одноразовую базу
+
+Для --sink postgres обе базы должны содержать схему сборщика: в основной (DB_NAME) — расширение vector,
+таблицы agencies (id, telegram, is_parsing, priority), categories, news, embs и представление news_view,
+принимающее INSERT; в старой (OLD_DB_NAME) — таблицу news. Таблица agency_watermarks создаётся при подключении.
+With --sink postgres both databases must have the collector schema: the main one (DB_NAME) needs the vector
+extension, the agencies (id, telegram, is_parsing, priority), categories, news and embs tables and an
+insertable news_view view; the old one (OLD_DB_NAME) needs a news table. agency_watermarks is created on connect.
+    python -m benchmarks.e2e --generation remote   # заголовки и резюме генерирует заглушка API
+"""
+import argparse
+import asyncio
+import hashlib
+import tempfile
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+from api.registry import registry
+from api.client import NewsAPIClient
+from db.database import DatabaseManager, InsertResult
+from news.cache import EnrichmentCache
+from news.dedup import NearDuplicateIndex
+from news.extractors import get_extractor
+from news.fetcher import TelegramFetcher, TokenBucket
+from news.parser import NewsParser
+from news.processor import NewsProcessor
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'channels'
+EMBEDDING_SIZE = 768
+CATEGORIES = ('politics', 'economy', 'society', 'science', 'sports')
+
+
+def load_channels(count: int) -> dict[str, str]:
+    """
+    Страницы каналов для count агентств: фикстуры повторяются под новыми именами,
+    чтобы ссылки на сообщения у агентств не совпадали.
+    Channel pages for count agencies: fixtures are repeated under new names
+    so that message links differ between agencies.
+    """
+    fixtures = {path.stem: path.read_text(encoding='utf-8') for path in sorted(FIXTURES.glob('*.html'))}
+    channels = {}
+    for i in range(count):
+        name, html = list(fixtures.items())[i % len(fixtures)]
+        agency = name if i < len(fixtures) else f'{name}_{i}'
+        channels[agency] = html.replace(f't.me/{name}/', f't.me/{agency}/')
+    return channels
+
+
+def stub_vector(text: str) -> list[float]:
+    seed = hashlib.sha256(text.encode()).digest()
+    return [seed[i % len(seed)] / 255 for i in range(EMBEDDING_SIZE)]
+
+
+def stub_app(channels: dict[str, str], tg_latency: float, api_latency: float, item_latency: float,
+             model_latency: float) -> web.Application:
+    """
+    Заглушка t.me/s/{agency} и сервисов API с задержкой на запрос и на каждый текст;
+    эндпоинты генерации тратят model_latency секунд на текст.
+    Stub of t.me/s/{agency} and the API services with per-request and per-text latency;
+    the generation endpoints spend model_latency seconds per text.
+    """
+
+    async def delay(items: int = 0):
+        await asyncio.sleep(api_latency + item_latency * items)
+
+    async def channel(request: web.Request) -> web.Response:
+        await asyncio.sleep(tg_latency)
+        html = channels.get(request.match_info['agency'])
+        if html is None:
+            raise web.HTTPNotFound()
+        return web.Response(text=html, content_type='text/html')
+
+    async def clean_text(request: web.Request) -> web.Response:
+        data = await request.json()
+        await delay(1)
+        return web.json_response({'clean_text': data['text'].strip()})
+
+    async def clean_text_batch(request: web.Request) -> web.Response:
+        data = await request.json()
+        await delay(len(data))
+        return web.json_response({'clean_texts': [item['text'].strip() for item in data]})
+
+    async def generate_embs(request: web.Request) -> web.Response:
+        texts = await request.json()
+        await delay(len(texts))
+        return web.json_response([stub_vector(text) for text in texts])
+
+    async def get_category(request: web.Request) -> web.Response:
+        texts = await request.json()
+        await delay(len(texts))
+        return web.json_response([CATEGORIES[len(text) % len(CATEGORIES)] for text in texts])
+
+    async def generate(request: web.Request) -> web.Response:
+        texts = await request.json()
+        await asyncio.sleep(api_latency + model_latency * len(texts))
+        return web.json_response([text[:100] for text in texts])
+
+    async def models_info(request: web.Request) -> web.Response:
+        return web.json_response({model: f'stub/{model}' for model in ('embedding', 'category', 'headline', 'summary')})
+
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app.router.add_get('/s/{agency}', channel)
+    app.router.add_post('/services/clean_text', clean_text)
+    app.router.add_post('/services/clean_text_batch', clean_text_batch)
+    app.router.add_post('/models/generate_embs', generate_embs)
+    app.router.add_post('/models/get_category', get_category)
+    app.router.add_get('/models/info', models_info)
+    app.router.add_post('/models/generate_resumes', generate)
+    app.router.add_post('/models/generate_headlines', generate)
+    return app
+
+
+class StubGenerator:
+    """Модель генерации с фиксированным временем на текст вместо mBART/ruT5."""
+
+    def __init__(self, seconds_per_text: float):
+        self.seconds_per_text = seconds_per_text
+
+    def process(self, texts: list[str], usage: dict = None) -> list[str]:
+        time.sleep(self.seconds_per_text * len(texts))
+        return [text[:100] for text in texts]
+
+
+class StubCategoryModel:
+    """Замена fasttext-модели старых категорий."""
+
+    def predict(self, texts: list[str]):
+        return [['__label__society'] for _ in texts], [[1.0] for _ in texts]
+
+
+class MemorySink:
+    """
+    Приёмник новостей в памяти с интерфейсом вставки DatabaseManager.
+    In-memory news sink with the DatabaseManager insert interface.
+    """
+
+    def __init__(self):
+        self.news: dict[str, object] = {}
+        self.old_news: dict[str, object] = {}
+        self.watermarks: dict[str, int] = {}
+
+    @staticmethod
+    def _insert(table: dict, news_items: dict) -> InsertResult:
+        result = InsertResult()
+        for items in news_items.values():
+            for item in items:
+                if item.url in table:
+                    result.duplicates += 1
+                else:
+                    table[item.url] = item
+                    result.inserted += 1
+        return result
+
+    async def insert_news_items(self, news_items: dict, advance_watermarks: bool = True,
+                                owner=None) -> InsertResult:
+        return self._insert(self.news, news_items)
+
+    async def update_watermark(self, agency: str, message_id: int, date, owner=None):
+        self.watermarks[agency] = max(self.watermarks.get(agency, 0), message_id)
+
+    async def insert_old_news_items(self, news_items: dict) -> InsertResult:
+        return self._insert(self.old_news, news_items)
+
+
+def first_ids(channels: dict[str, str]) -> dict[str, int]:
+    """last_id для каждого агентства такой, чтобы все сообщения страницы были новыми без догрузки истории."""
+    extractor = get_extractor()
+    return {agency: min(extractor.extract(html)) - 1 for agency, html in channels.items()}
+
+
+async def run_once(base_url: str, agencies: dict[str, int], sink, dedup: bool, cache_path: str, generation: str,
+                   fetch_rate: float):
+    # Локальная заглушка не ограничивает частоту: по умолчанию ведро токенов отключено (rate=0)
+    async with TelegramFetcher(base_url, limiter=TokenBucket(rate=fetch_rate)) as fetcher, \
+            NewsAPIClient(base_url, generation_backend=generation) as api_client:
+        processor = NewsProcessor(
+            NewsParser(api_client, fetcher), sink,
+            dedup=NearDuplicateIndex() if dedup else None,
+            cache=EnrichmentCache(cache_path) if cache_path else None
+        )
+        started = time.perf_counter()
+        result, _ = await processor.process_agencies(agencies)
+        return time.perf_counter() - started, result, processor.pipeline
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agencies', type=int, default=30, help='число агентств (фикстуры повторяются)')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--tg-latency', type=float, default=50, help='задержка t.me, мс')
+    parser.add_argument('--fetch-rate', type=float, default=0,
+                        help='лимит запросов к t.me в секунду (FETCH_RATE), 0 — без ограничения')
+    parser.add_argument('--api-latency', type=float, default=30, help='задержка запроса к API, мс')
+    parser.add_argument('--item-latency', type=float, default=2, help='задержка API на каждый текст, мс')
+    parser.add_argument('--model-latency', type=float, default=20, help='время генерации на текст, мс')
+    parser.add_argument('--real-models', action='store_true', help='настоящие модели вместо заглушек')
+    parser.add_argument('--generation', choices=['local', 'remote', 'auto'], default='local',
+                        help='бэкенд генерации заголовков и резюме (GENERATION_BACKEND)')
+    parser.add_argument('--sink', choices=['memory', 'postgres'], default='memory')
+    parser.add_argument('--dedup', action='store_true', help='включить индекс почти-дубликатов')
+    parser.add_argument('--cache', action='store_true', help='включить кэш обогащения (временный файл)')
+    args = parser.parse_args()
+
+    if args.generation != 'remote':
+        import api.services  # noqa: F401 регистрирует локальные модели до подмены заглушками
+    if not args.real_models:
+        registry.register('summary', lambda: StubGenerator(args.model_latency / 1000))
+        registry.register('headline', lambda: StubGenerator(args.model_latency / 2000))
+        registry.register('old_category', StubCategoryModel)
+
+    channels = load_channels(args.agencies)
+    agencies = first_ids(channels)
+    runner = web.AppRunner(stub_app(channels, args.tg_latency / 1000, args.api_latency / 1000, args.item_latency / 1000,
+                                    args.model_latency / 1000))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    base_url = f'http://127.0.0.1:{runner.addresses[0][1]}'
+
+    try:
+        for run in range(1, args.runs + 1):
+            cache_path = str(Path(tempfile.mkdtemp()) / 'cache.sqlite') if args.cache else ''
+            if args.sink == 'postgres':
+                async with DatabaseManager() as sink:
+                    seconds, result, pipeline = await run_once(base_url, agencies, sink, args.dedup, cache_path,
+                                                               args.generation, args.fetch_rate)
+            else:
+                seconds, result, pipeline = await run_once(base_url, agencies, MemorySink(), args.dedup, cache_path,
+                                                           args.generation, args.fetch_rate)
+
+            print(f'run {run}: {result.total} news from {len(agencies)} agencies in {seconds:.2f} s, '
+                  f'{result.total / seconds:.1f} news/s (inserted {result.inserted}, duplicates {result.duplicates})')
+            for stats in pipeline.stats.values():
+                print(f'  {stats.name:<8} busy {stats.busy_seconds:7.2f} s, blocked {stats.blocked_seconds:7.2f} s, '
+                      f'{stats.items:5} {"pages" if stats.name == "fetch" else "news"}, '
+                      f'workers {stats.workers}, utilization {stats.utilization(pipeline.wall_seconds):.0%}')
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Пиковая память и время пакета обогащения при хранении эмбеддингов списком float (прежний NewsItem)
+и массивом float32: от ответа /models/generate_embs до строк для записи в базу, по tracemalloc.
+Peak memory and time of an enrichment batch with embeddings stored as a list of floats (the previous
+NewsItem) and as a float32 array: from the /models/generate_embs response to the rows written to the DB,
+measured with tracemalloc.
+
+Запуск из каталога tandem-collector | Run from the tandem-collector directory:
+    python -m benchmarks.embedding_memory --items 256
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+from pydantic import BaseModel
+
+from db.database import DatabaseManager
+from models.news_item import NewsItem
+
+DIMENSIONS = 768
+
+
+class ListNewsItem(BaseModel):
+    """Прежнее представление: эмбеддинг — список из 768 объектов float."""
+    url: str
+    date: datetime
+    news: str
+    links: list = []
+    agency: str
+    title: str = ""
+    resume: str = ""
+    embedding: list[float] = []
+    category: str = ""
+
+
+def list_batch(payload: str) -> tuple[list, list]:
+    embeddings = json.loads(payload)
+    items = [ListNewsItem(url=f'https://t.me/bench/{i}', date=datetime.now(), news='', agency='bench',
+                          embedding=embedding) for i, embedding in enumerate(embeddings)]
+    # Прежний путь к базе: строка JSON на каждую новость
+    return items, [json.dumps(item.embedding) for item in items]
+
+
+def array_batch(payload: str) -> tuple[list, list]:
+    embeddings = np.asarray(json.loads(payload), dtype=np.float32)
+    items = [NewsItem(url=f'https://t.me/bench/{i}', date=datetime.now(), news='', agency='bench',
+                      embedding=embedding) for i, embedding in enumerate(embeddings)]
+    return items, [DatabaseManager.prepare_embedding(item.embedding) for item in items]
+
+
+def measure(build, payload: str) -> tuple[float, int, int]:
+    """Время, пиковая память пакета и память, которую держат готовые новости."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    items, rows = build(payload)
+    seconds = time.perf_counter() - started
+    del rows
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return seconds, peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=256, help='размер пакета (PIPELINE_MAX_INFLIGHT_ITEMS)')
+    args = parser.parse_args()
+
+    vectors = np.random.default_rng(0).standard_normal((args.items, DIMENSIONS), dtype=np.float32)
+    payload = json.dumps(vectors.tolist())
+    print(f'items: {args.items}, dimensions: {DIMENSIONS}, response: {len(payload) / 2 ** 20:.1f} MiB')
+    for name, build in (('list[float]', list_batch), ('float32', array_batch)):
+        seconds, peak, retained = measure(build, payload)
+        print(f'{name:<12} {seconds * 1000:8.1f} ms, peak {peak / 2 ** 20:6.1f} MiB, '
+              f'items hold {retained / 2 ** 20:6.1f} MiB ({retained / args.items / 1024:.1f} KiB per item)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Сравнение пакетной генерации с динамическим паддингом и прежнего цикла по одному тексту на CPU.
+Benchmark of batched dynamic-padding generation against the previous per-item loop on CPU.
+
+Запуск из каталога tandem-collector | Run from the tandem-collector directory:
+    python -m benchmarks.generation --model summary --repeat 3
+"""
+import argparse
+import json
+from pathlib import Path
+
+from api.registry import registry
+import api.services  # noqa: F401 регистрирует модели заголовков и резюме
+from api.services import MAX_INPUT_LENGTH, SummaryModel
+from benchmarks.common import timed
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def load_texts(path: Path = FIXTURES / 'news_texts.json', limit: int = None) -> list[str]:
+    texts = json.loads(path.read_text(encoding='utf-8'))
+    return texts[:limit] if limit else texts
+
+
+def per_item_loop(model, texts: list[str], **generate_kwargs) -> list[str]:
+    """Прежняя реализация: один вызов generate на текст с паддингом до 600 токенов."""
+    results = []
+    for text in texts:
+        input_ids = model.tokenizer(
+            [text],
+            max_length=MAX_INPUT_LENGTH,
+            add_special_tokens=True,
+            padding="max_length",
+            truncation=True,
+            return_tensors="pt"
+        )["input_ids"].to(model.device)
+        output_ids = model.model.generate(input_ids=input_ids, **generate_kwargs)[0]
+        results.append(model.tokenizer.decode(output_ids, skip_special_tokens=True))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--model', choices=['headline', 'summary'], default='headline')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--limit', type=int, default=None)
+    args = parser.parse_args()
+
+    texts = load_texts(limit=args.limit)
+    model = registry.get(args.model)
+    generate_kwargs = {'no_repeat_ngram_size': 4} if isinstance(model, SummaryModel) else {}
+
+    loop_seconds, loop_results = timed(lambda: per_item_loop(model, texts, **generate_kwargs), args.repeat)
+    batch_seconds, batch_results = timed(lambda: model.process(texts), args.repeat)
+
+    same = sum(a == b for a, b in zip(loop_results, batch_results))
+    print(f'model: {args.model}, texts: {len(texts)}, budget: {model.token_budget} tokens, max batch: {model.max_batch}')
+    print(f'per-item loop: {loop_seconds:.2f} s ({len(texts) / loop_seconds:.2f} texts/s)')
+    print(f'batched:       {batch_seconds:.2f} s ({len(texts) / batch_seconds:.2f} texts/s)')
+    print(f'speedup: x{loop_seconds / batch_seconds:.2f}, identical outputs: {same}/{len(texts)}')
+
+
+if __name__ == '__main__':
+    main()
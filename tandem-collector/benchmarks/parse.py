@@ -0,0 +1,45 @@
+"""
+Сравнение пропускной способности бэкендов разбора страниц каналов (soup и lxml) на сохранённых страницах t.me/s.
+Throughput benchmark of the channel page extraction backends (soup and lxml) on saved t.me/s pages.
+
+Запуск из каталога tandem-collector | Run from the tandem-collector directory:
+    python -m benchmarks.parse --repeat 20
+"""
+import argparse
+import time
+from pathlib import Path
+
+from news.extractors import EXTRACTORS
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'channels'
+
+
+def load_pages(path: Path = FIXTURES) -> dict[str, str]:
+    return {page.stem: page.read_text(encoding='utf-8') for page in sorted(path.glob('*.html'))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = load_pages()
+    results = {}
+    for name, extractor_class in EXTRACTORS.items():
+        extractor = extractor_class()
+        messages = 0
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for html in pages.values():
+                messages += len(extractor.extract(html))
+        seconds = time.perf_counter() - started
+        results[name] = seconds
+        print(f'{name:>5}: {seconds:.3f} s, {len(pages) * args.repeat / seconds:.1f} pages/s, '
+              f'{messages / seconds:.0f} messages/s')
+
+    if 'soup' in results and 'lxml' in results:
+        print(f'speedup lxml vs soup: x{results["soup"] / results["lxml"]:.2f}')
+
+
+if __name__ == '__main__':
+    main()
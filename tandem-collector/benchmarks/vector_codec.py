@@ -0,0 +1,74 @@
+"""
+Сравнение передачи эмбеддингов в Postgres строкой JSON (прежний путь) и двоичным кодеком pgvector:
+время кодирования, объём данных и, с флагом --db, время COPY во временную таблицу.
+Comparison of sending embeddings to Postgres as JSON text (the previous path) and through the binary
+pgvector codec: encoding time, payload size and, with --db, the time of a COPY into a temporary table.
+
+Запуск из каталога tandem-collector | Run from the tandem-collector directory:
+    python -m benchmarks.vector_codec --rows 5000
+    python -m benchmarks.vector_codec --rows 5000 --db   # переменные DB_* указывают на базу с pgvector
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from benchmarks.common import timed
+from db.database import DatabaseManager
+from db.vector_codec import encode_vector
+
+DIMENSIONS = 768
+
+
+async def copy_seconds(db_manager: DatabaseManager, column_type: str, records: list[tuple], repeat: int) -> float:
+    """Лучшее время COPY записей во временную таблицу с колонкой embedding типа column_type."""
+    best = float('inf')
+    async with db_manager.main_pool.acquire() as conn:
+        for _ in range(repeat):
+            async with conn.transaction():
+                # Своё имя таблицы на тип: asyncpg кэширует типы колонок подготовленного COPY
+                table = f'bench_embs_{column_type}'
+                await conn.execute(f'CREATE TEMP TABLE {table} (url text, embedding {column_type}) ON COMMIT DROP')
+                started = time.perf_counter()
+                await conn.copy_records_to_table(table, records=records, columns=['url', 'embedding'])
+                if column_type == 'text':
+                    # Прежний путь: текст разбирается в vector при слиянии с целевой таблицей
+                    await conn.execute(f'SELECT count(embedding::vector) FROM {table}')
+                best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--db', action='store_true', help='измерить также COPY в базу')
+    args = parser.parse_args()
+
+    embeddings = [row.tolist() for row in np.random.default_rng(0).standard_normal((args.rows, DIMENSIONS),
+                                                                                  dtype=np.float32)]
+    json_seconds, json_payload = timed(lambda: [json.dumps(embedding) for embedding in embeddings], args.repeat)
+    binary_seconds, binary_payload = timed(lambda: [encode_vector(embedding) for embedding in embeddings], args.repeat)
+    json_bytes = sum(len(value) for value in json_payload)
+    binary_bytes = sum(len(value) for value in binary_payload)
+
+    print(f'rows: {args.rows}, dimensions: {DIMENSIONS}')
+    print(f'json:   encode {json_seconds * 1000:8.1f} ms, {json_bytes / 2 ** 20:7.1f} MiB')
+    print(f'binary: encode {binary_seconds * 1000:8.1f} ms, {binary_bytes / 2 ** 20:7.1f} MiB '
+          f'(x{json_seconds / binary_seconds:.1f} faster, x{json_bytes / binary_bytes:.1f} smaller)')
+
+    if args.db:
+        async with DatabaseManager() as db_manager:
+            text_records = [(f'url{i}', value) for i, value in enumerate(json_payload)]
+            vector_records = [(f'url{i}', np.asarray(embedding, dtype=np.float32))
+                              for i, embedding in enumerate(embeddings)]
+            text_seconds = await copy_seconds(db_manager, 'text', text_records, args.repeat)
+            vector_seconds = await copy_seconds(db_manager, 'vector', vector_records, args.repeat)
+        print(f'COPY json text + ::vector: {text_seconds * 1000:8.1f} ms')
+        print(f'COPY binary vector:        {vector_seconds * 1000:8.1f} ms (x{text_seconds / vector_seconds:.1f})')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
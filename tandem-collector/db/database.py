@@ -1,14 +1,96 @@
+import asyncio
 import asyncpg
-import json
+from dataclasses import dataclass, field
 from datetime import datetime
 from loguru import logger
 import os
-from typing import Union
+import time
+from typing import Optional, Union
 
 # from dotenv import load_dotenv
 # load_dotenv()
 
+import numpy as np
+
+from db.vector_codec import register_vector_codec
 from models.news_item import NewsItem, OldNewsItem
+from monitoring.metrics import DB_INSERT_SECONDS, DB_ROWS
+
+# Размеры пулов подключений, время жизни простаивающего соединения и таймаут запросов
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 5))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", 300))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", 120))
+
+# Размер пакета для массовой вставки через COPY
+DB_BULK_BATCH_SIZE = int(os.getenv("DB_BULK_BATCH_SIZE", 500))
+
+# Колонки и типы временных таблиц для массовой вставки
+NEWS_VIEW_STAGING = {
+    "url": "text", "date": "timestamp", "news": "text", "links": "text[]", "agency": "text",
+    "title": "text", "resume": "text", "embedding": "vector", "category": "text"
+}
+OLD_NEWS_STAGING = {
+    "url": "text", "date": "timestamp", "news": "text", "links": "text", "agency": "text",
+    "title": "text", "resume": "text", "category": "text"
+}
+
+# Водяные знаки агентств: номер последнего сообщения и дата, обновляются в одной транзакции со вставкой
+WATERMARKS_DDL = """
+    CREATE TABLE IF NOT EXISTS agency_watermarks (
+        agency_id integer PRIMARY KEY REFERENCES agencies (id),
+        last_message_id bigint NOT NULL DEFAULT 0,
+        last_date timestamp,
+        updated_at timestamp NOT NULL DEFAULT now()
+    )
+"""
+WATERMARK_UPSERT = """
+    ON CONFLICT (agency_id) DO UPDATE SET
+        last_message_id = GREATEST(agency_watermarks.last_message_id, EXCLUDED.last_message_id),
+        last_date = GREATEST(agency_watermarks.last_date, EXCLUDED.last_date),
+        updated_at = now()
+"""
+# Проверка аренды агентства внутри транзакции записи: FOR SHARE не даёт передать аренду до её конца
+LEASE_FENCE = """
+    SELECT 1 FROM agency_leases WHERE agency = $1 AND owner = $2 AND expires_at > now() FOR SHARE
+"""
+
+
+class LeaseLost(Exception):
+    """
+    Аренда агентства истекла или перешла к другому экземпляру: транзакция записи откатывается.
+    The agency lease expired or moved to another instance: the write transaction is rolled back.
+    """
+
+    def __init__(self, agency: str, owner: str):
+        super().__init__(f'{agency}: аренда {owner} не действует')
+        self.agency = agency
+        self.owner = owner
+
+
+@dataclass
+class InsertResult:
+    """
+    Итог вставки пакета новостей с точными счётчиками по строкам.
+    Outcome of a news batch insert with exact per-row counts.
+    """
+    inserted: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    # Ссылки новостей, которые не удалось вставить
+    failed_urls: set[str] = field(default_factory=set)
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.duplicates + self.failed
+
+    def __add__(self, other: 'InsertResult') -> 'InsertResult':
+        return InsertResult(
+            inserted=self.inserted + other.inserted,
+            duplicates=self.duplicates + other.duplicates,
+            failed=self.failed + other.failed,
+            failed_urls=self.failed_urls | other.failed_urls
+        )
 
 
 class DatabaseManager:
@@ -32,16 +114,104 @@ class DatabaseManager:
         self.main_pool = None
         self.old_pool = None
 
+    async def connect(self):
+        """
+        Создаёт пулы подключений к обеим базам данных; пулы живут до вызова close().
+        Creates connection pools for both databases; the pools live until close() is called.
+        """
+        pool_config = {
+            "min_size": DB_POOL_MIN_SIZE,
+            "max_size": DB_POOL_MAX_SIZE,
+            "max_inactive_connection_lifetime": DB_POOL_MAX_IDLE,
+            "command_timeout": DB_COMMAND_TIMEOUT
+        }
+        # Эмбеддинги основной базы передаются в двоичном формате pgvector
+        self.main_pool = await asyncpg.create_pool(**self.main_db_config, **pool_config, init=register_vector_codec)
+        self.old_pool = await asyncpg.create_pool(**self.old_db_config, **pool_config)
+        await self.ensure_watermarks()
+
+    async def close(self):
+        for pool in (self.main_pool, self.old_pool):
+            if pool:
+                await pool.close()
+        self.main_pool = None
+        self.old_pool = None
+
     async def __aenter__(self):
         # Создаем пулы подключений для обеих баз данных
-        self.main_pool = await asyncpg.create_pool(**self.main_db_config)
-        self.old_pool = await asyncpg.create_pool(**self.old_db_config)
+        await self.connect()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         # Закрываем оба пула при выходе из контекстного менеджера
-        await self.main_pool.close()
-        await self.old_pool.close()
+        await self.close()
+
+    async def health_check(self) -> bool:
+        """
+        Проверяет соединения обоих пулов; при ошибке сбрасывает соединения пула,
+        чтобы следующий запрос открыл новые.
+        Checks the connections of both pools; on failure expires the pool connections
+        so that the next request opens fresh ones.
+        """
+        healthy = True
+        for name, pool in (('main', self.main_pool), ('old', self.old_pool)):
+            try:
+                async with pool.acquire() as conn:
+                    await conn.fetchval('SELECT 1')
+            except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError) as e:
+                healthy = False
+                logger.warning(f'Пул {name} не прошёл проверку соединения: {str(e)}')
+                await pool.expire_connections()
+        return healthy
+
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        """Текущее состояние пулов: размер, простаивающие соединения и границы."""
+        return {
+            name: {
+                "size": pool.get_size(),
+                "idle": pool.get_idle_size(),
+                "min": pool.get_min_size(),
+                "max": pool.get_max_size()
+            }
+            for name, pool in (('main', self.main_pool), ('old', self.old_pool)) if pool
+        }
+
+    async def ensure_watermarks(self):
+        """
+        Создаёт таблицу водяных знаков агентств и заполняет её из news, если она пуста.
+        В базе без таблиц agencies и news (например, пустой базе бенчмарка) ничего не делает.
+        Creates the agency watermark table and fills it from news if it is empty.
+        Does nothing in a database without the agencies and news tables (e.g. an empty benchmark database).
+        """
+        async with self.main_pool.acquire() as conn:
+            if not await conn.fetchval("SELECT to_regclass('agencies') IS NOT NULL AND to_regclass('news') IS NOT NULL"):
+                logger.warning('В основной базе нет таблиц agencies и news: водяные знаки агентств не созданы')
+                return
+            await conn.execute(WATERMARKS_DDL)
+            if not await conn.fetchval('SELECT EXISTS (SELECT 1 FROM agency_watermarks)'):
+                await self.rebuild_watermarks(conn)
+
+    async def rebuild_watermarks(self, conn=None) -> int:
+        """
+        Пересчитывает водяные знаки всех агентств по таблице news.
+        Rebuilds the watermarks of all agencies from the news table.
+        """
+        if conn is None:
+            async with self.main_pool.acquire() as conn:
+                return await self.rebuild_watermarks(conn)
+
+        async with conn.transaction():
+            await conn.execute('DELETE FROM agency_watermarks')
+            status = await conn.execute("""
+                INSERT INTO agency_watermarks (agency_id, last_message_id, last_date)
+                SELECT n.agency_id, MAX(SPLIT_PART(n.url, '/', -1)::bigint), MAX(n.date)
+                FROM news n
+                WHERE SPLIT_PART(n.url, '/', -1) ~ '^[0-9]+$' AND n.agency_id IS NOT NULL
+                GROUP BY n.agency_id
+            """)
+        count = int(status.split()[-1])
+        logger.info(f'Водяные знаки пересчитаны для {count} агентств')
+        return count
 
     async def get_last_agencies_dict(self) -> dict[str, int]:
         """
@@ -49,28 +219,96 @@ class DatabaseManager:
         """
         async with self.main_pool.acquire() as conn:
             query = """
-            SELECT t1.agency, 
-                   COALESCE(SPLIT_PART(n.url, '/', -1), '0') AS last_news_id
-            FROM
-                (SELECT a.telegram AS agency, MAX(n.date) AS date
-                 FROM agencies a
-                 LEFT JOIN news n ON a.id = n.agency_id
-                 WHERE a.is_parsing is True
-                 GROUP BY a.telegram) t1
-            LEFT JOIN news n ON n.date = t1.date AND n.agency_id = (SELECT id FROM agencies WHERE telegram = t1.agency)
+            SELECT a.telegram AS agency,
+                   COALESCE(w.last_message_id, 0) AS last_news_id
+            FROM agencies a
+            LEFT JOIN agency_watermarks w ON w.agency_id = a.id
+            WHERE a.is_parsing is True
             """
             result = await conn.fetch(query)
             return {agency: int(last_url_number) for agency, last_url_number in result}
 
+    async def get_agency_activity(self, hours: float) -> list[dict]:
+        """
+        Число новостей каждого агентства за последние hours часов и его приоритет.
+        News count of every agency over the last hours hours and its priority.
+        """
+        async with self.main_pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT a.telegram AS agency, a.priority, COUNT(n.url) AS news
+                FROM agencies a
+                LEFT JOIN news n ON n.agency_id = a.id
+                    AND n.date >= (SELECT MAX(date) FROM news) - make_interval(secs => $1)
+                WHERE a.is_parsing is True
+                GROUP BY a.telegram, a.priority
+            """, hours * 3600)
+        return [dict(row) for row in rows]
+
+    async def get_recent_news(self, hours: float) -> list[NewsItem]:
+        """
+        Обогащённые новости за последние hours часов для индекса почти-дубликатов.
+        Enriched news of the last hours hours for the near-duplicate index.
+        """
+        async with self.main_pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT url, date, news, links, agency, title, resume, category, embedding
+                FROM news_view
+                WHERE date >= (SELECT MAX(date) FROM news) - make_interval(secs => $1)
+                  AND embedding IS NOT NULL
+            """, hours * 3600)
+        return [
+            NewsItem(**{**dict(row), 'links': row['links'] or []})
+            for row in rows
+        ]
+
+    @staticmethod
+    async def check_leases(conn, agencies, owner: Optional[str]):
+        """
+        Проверяет в текущей транзакции, что owner держит аренды агентств, иначе бросает LeaseLost.
+        Checks within the current transaction that owner holds the agency leases, raising LeaseLost otherwise.
+        """
+        if owner is None:
+            return
+        for agency in sorted(set(agencies)):
+            if not await conn.fetchval(LEASE_FENCE, agency, owner):
+                raise LeaseLost(agency, owner)
+
+    @staticmethod
+    async def advance_watermark(conn, agency: str, url: str, date: datetime):
+        """Сдвигает водяной знак агентства по одной вставленной новости."""
+        await conn.execute(f"""
+            INSERT INTO agency_watermarks (agency_id, last_message_id, last_date)
+            SELECT id, $2, $3 FROM agencies WHERE telegram = $1
+            {WATERMARK_UPSERT}
+        """, agency, int(url.split('/')[-1]), date)
+
+    async def update_watermark(self, agency: str, message_id: int, date: datetime, owner: Optional[str] = None):
+        """
+        Сдвигает водяной знак агентства вперёд до message_id; используется, когда запись новостей
+        и сдвиг водяного знака разделены, например при записи агентства несколькими микропакетами.
+        С owner водяной знак сдвигается, только пока экземпляр держит аренду агентства.
+        Moves the agency watermark forward to message_id; used when writing news and advancing
+        the watermark are separate, e.g. when an agency is written in several micro-batches.
+        With owner the watermark moves only while the instance holds the agency lease.
+        """
+        async with self.main_pool.acquire() as conn:
+            async with conn.transaction():
+                await self.check_leases(conn, [agency], owner)
+                await conn.execute(f"""
+                    INSERT INTO agency_watermarks (agency_id, last_message_id, last_date)
+                    SELECT id, $2, $3 FROM agencies WHERE telegram = $1
+                    {WATERMARK_UPSERT}
+                """, agency, message_id, self.ensure_naive_datetime(date))
+
     @staticmethod
     def ensure_naive_datetime(dt: datetime) -> datetime:
         """Убеждается, что datetime не имеет информации о часовом поясе."""
         return dt.replace(tzinfo=None) if dt.tzinfo else dt
 
     @staticmethod
-    def prepare_embedding(embedding: list[float]) -> str:
-        """Преобразует список с embedding в строку JSON."""
-        return json.dumps(embedding)
+    def prepare_embedding(embedding: Union[np.ndarray, list[float]]) -> np.ndarray:
+        """Массив float32 для двоичного кодека pgvector; эмбеддинги NewsItem передаются без копирования."""
+        return np.asarray(embedding, dtype=np.float32)
 
     async def insert_or_update_news_item(
             self,
@@ -109,48 +347,188 @@ class DatabaseManager:
             logger.error(f"Ошибка при вставке/обновлении новости с URL {item.url}: {str(e)}")
             return False
 
-    async def insert_news_items(self, news_items: dict[str, list[NewsItem]]) -> int:
-        """Вставляет или обновляет набор новостей в основную базу данных."""
+    def news_record(self, item: Union[NewsItem, OldNewsItem], is_old_format: bool = False) -> tuple:
+        """Готовит строку новости для COPY во временную таблицу."""
+        record = (item.url, self.ensure_naive_datetime(item.date), item.news, item.links,
+                  item.agency, item.title, item.resume)
+        if is_old_format:
+            return record + (item.category,)
+        return record + (self.prepare_embedding(item.embedding), item.category)
+
+    async def bulk_insert(self, conn, items: list[Union[NewsItem, OldNewsItem]], is_old_format: bool = False,
+                          advance_watermarks: bool = True, owner: Optional[str] = None) -> InsertResult:
+        """
+        Вставляет пакет новостей одной транзакцией: COPY во временную таблицу и слияние
+        с целевой таблицей с пропуском уже существующих пар (url, date).
+
+        Inserts a news batch in one transaction: COPY into a temporary table, then a merge
+        into the target table that skips (url, date) pairs that already exist.
+        """
+        table, staging_columns = ('news', OLD_NEWS_STAGING) if is_old_format else ('news_view', NEWS_VIEW_STAGING)
+        staging = f'staging_{table}'
+        columns = list(staging_columns)
+        column_types = ', '.join(f'{column} {column_type}' for column, column_type in staging_columns.items())
+        select_columns = ', '.join(f's.{c}' for c in columns)
+
+        # Повторы внутри самого пакета считаются дубликатами
+        records = {}
+        for item in items:
+            record = self.news_record(item, is_old_format)
+            records.setdefault((record[0], record[1]), record)
+        result = InsertResult(duplicates=len(items) - len(records))
+
+        async with conn.transaction():
+            await self.check_leases(conn, [item.agency for item in items], owner)
+            await conn.execute(f'CREATE TEMP TABLE {staging} ({column_types}) ON COMMIT DROP')
+            await conn.copy_records_to_table(staging, records=list(records.values()), columns=columns)
+            existing = await conn.fetchval(f'''
+                SELECT count(*) FROM {staging} s
+                WHERE EXISTS (SELECT 1 FROM {table} t WHERE t.url = s.url AND t.date = s.date)
+            ''')
+            status = await conn.execute(f'''
+                INSERT INTO {table} ({', '.join(columns)})
+                SELECT {select_columns} FROM {staging} s
+                WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.url = s.url AND t.date = s.date)
+            ''')
+            if not is_old_format and advance_watermarks:
+                # Водяные знаки сдвигаются только по новостям, которые действительно есть в базе
+                await conn.execute(f'''
+                    INSERT INTO agency_watermarks (agency_id, last_message_id, last_date)
+                    SELECT a.id, MAX(SPLIT_PART(s.url, '/', -1)::bigint), MAX(s.date)
+                    FROM {staging} s
+                    JOIN agencies a ON a.telegram = s.agency
+                    WHERE SPLIT_PART(s.url, '/', -1) ~ '^[0-9]+$'
+                      AND EXISTS (SELECT 1 FROM news n WHERE n.url = s.url AND n.date = s.date)
+                    GROUP BY a.id
+                    {WATERMARK_UPSERT}
+                ''')
+
+        result.duplicates += existing
+        result.inserted = int(status.split()[-1])
+        result.failed = len(records) - existing - result.inserted
+        return result
+
+    async def row_by_row_insert(self, conn, items: list[Union[NewsItem, OldNewsItem]], is_old_format: bool = False,
+                                advance_watermarks: bool = True, owner: Optional[str] = None) -> InsertResult:
+        """
+        Запасной путь для пакета, который не удалось вставить целиком: вставка по одной новости.
+        Fallback for a batch that failed as a whole: inserts news one by one.
+        """
+        table = 'news' if is_old_format else 'news_view'
+        result = InsertResult()
+        for item in items:
+            exists = await conn.fetchval(
+                f'SELECT 1 FROM {table} WHERE url = $1 AND date = $2',
+                item.url, self.ensure_naive_datetime(item.date)
+            )
+            if exists:
+                result.duplicates += 1
+                continue
+            async with conn.transaction():
+                await self.check_leases(conn, [item.agency], owner)
+                inserted = await self.insert_or_update_news_item(conn, item, is_old_format=is_old_format)
+                if inserted and not is_old_format and advance_watermarks:
+                    await self.advance_watermark(conn, item.agency, item.url, self.ensure_naive_datetime(item.date))
+            if inserted:
+                result.inserted += 1
+            else:
+                result.failed += 1
+                result.failed_urls.add(item.url)
+        return result
+
+    async def insert_batches(self, pool, news_items: dict[str, list[Union[NewsItem, OldNewsItem]]],
+                             is_old_format: bool = False, advance_watermarks: bool = True,
+                             owner: Optional[str] = None) -> InsertResult:
+        """
+        Вставляет новости пакетами по DB_BULK_BATCH_SIZE, откатываясь на построчную вставку при ошибке;
+        потеря аренды (LeaseLost) прерывает вставку.
+        """
+        items = [item for agency_items in news_items.values() for item in agency_items]
+        result = InsertResult()
+        started = time.perf_counter()
+        async with pool.acquire() as conn:
+            for start in range(0, len(items), DB_BULK_BATCH_SIZE):
+                batch = items[start:start + DB_BULK_BATCH_SIZE]
+                try:
+                    result += await self.bulk_insert(conn, batch, is_old_format, advance_watermarks, owner)
+                except LeaseLost:
+                    raise
+                except Exception as e:
+                    logger.error(f"Ошибка массовой вставки пакета из {len(batch)} новостей, "
+                                 f"переход на построчную вставку: {str(e)}")
+                    result += await self.row_by_row_insert(conn, batch, is_old_format, advance_watermarks, owner)
+
+        db = 'old' if is_old_format else 'main'
+        DB_INSERT_SECONDS.labels(db).observe(time.perf_counter() - started)
+        DB_ROWS.labels(db, 'inserted').inc(result.inserted)
+        DB_ROWS.labels(db, 'duplicates').inc(result.duplicates)
+        DB_ROWS.labels(db, 'failed').inc(result.failed)
+        return result
+
+    async def insert_embeddings(self, rows: list[tuple[str, datetime, Union[np.ndarray, list[float]]]]) -> InsertResult:
+        """
+        Дописывает эмбеддинги уже сохранённых новостей одной транзакцией через COPY; строки новостей,
+        которых нет в базе или у которых эмбеддинг уже появился, считаются дубликатами.
+        Writes embeddings of already stored news in one transaction via COPY; rows for news that are
+        missing from the database or already have an embedding count as duplicates.
+        """
+        records = {
+            (url, self.ensure_naive_datetime(date)): self.prepare_embedding(embedding)
+            for url, date, embedding in rows
+        }
+        result = InsertResult(duplicates=len(rows) - len(records))
+        if not records:
+            return result
+
+        started = time.perf_counter()
+        async with self.main_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    'CREATE TEMP TABLE staging_embs (url text, date timestamp, embedding vector) ON COMMIT DROP'
+                )
+                await conn.copy_records_to_table(
+                    'staging_embs', records=[(*key, embedding) for key, embedding in records.items()],
+                    columns=['url', 'date', 'embedding']
+                )
+                status = await conn.execute('''
+                    INSERT INTO embs (url, date, embedding)
+                    SELECT s.url, s.date, s.embedding FROM staging_embs s
+                    WHERE EXISTS (SELECT 1 FROM news n WHERE n.url = s.url AND n.date = s.date)
+                      AND NOT EXISTS (SELECT 1 FROM embs e WHERE e.url = s.url AND e.date = s.date)
+                ''')
+        result.inserted = int(status.split()[-1])
+        result.duplicates += len(records) - result.inserted
+
+        DB_INSERT_SECONDS.labels('embs').observe(time.perf_counter() - started)
+        DB_ROWS.labels('embs', 'inserted').inc(result.inserted)
+        DB_ROWS.labels('embs', 'duplicates').inc(result.duplicates)
+        return result
+
+    async def insert_news_items(self, news_items: dict[str, list[NewsItem]],
+                                advance_watermarks: bool = True, owner: Optional[str] = None) -> InsertResult:
+        """
+        Вставляет набор новостей в основную базу данных. С advance_watermarks=False водяные знаки
+        агентств не сдвигаются: их обновляет вызывающий код через update_watermark. С owner каждая
+        транзакция вставки сначала проверяет аренды агентств экземпляром owner и при потере аренды
+        откатывается с LeaseLost.
+        """
         if not news_items or all(len(items) == 0 for items in news_items.values()):
             logger.warning("Не поступило новостей для вставки.")
-            return 0
+            return InsertResult()
 
-        total_count = sum(len(items) for items in news_items.values())
-        success_count = 0
-        fail_count = 0
+        result = await self.insert_batches(self.main_pool, news_items, advance_watermarks=advance_watermarks,
+                                           owner=owner)
+        logger.debug(f"Новости: поступило {result.total}, вставлено {result.inserted}, "
+                     f"уже были в базе {result.duplicates}, не удалось вставить {result.failed}")
+        return result
 
-        async with self.main_pool.acquire() as conn:
-            for items in news_items.values():
-                for item in items:
-                    if await self.insert_or_update_news_item(conn, item):
-                        success_count += 1
-                    else:
-                        fail_count += 1
-
-        logger.info(f"Всего поступило новостей: {total_count}")
-        logger.info(f"Успешно вставлено/обновлено: {success_count}")
-        logger.info(f"Не удалось вставить/обновить: {fail_count}")
-        return total_count
-
-    async def insert_old_news_items(self, news_items: dict[str, list[OldNewsItem]]) -> int:
-        """Вставляет или обновляет набор новостей в старую базу данных."""
+    async def insert_old_news_items(self, news_items: dict[str, list[OldNewsItem]]) -> InsertResult:
+        """Вставляет набор новостей в старую базу данных."""
         if not news_items or all(len(items) == 0 for items in news_items.values()):
             logger.warning("Не поступило новостей старого формата для вставки.")
-            return 0
-
-        total_count = sum(len(items) for items in news_items.values())
-        success_count = 0
-        fail_count = 0
-
-        async with self.old_pool.acquire() as conn:
-            for items in news_items.values():
-                for item in items:
-                    if await self.insert_or_update_news_item(conn, item, is_old_format=True):
-                        success_count += 1
-                    else:
-                        fail_count += 1
-
-        logger.info(f"Всего поступило новостей старого формата: {total_count}")
-        logger.info(f"Успешно вставлено/обновлено: {success_count}")
-        logger.info(f"Не удалось вставить/обновить: {fail_count}")
-        return total_count
\ No newline at end of file
+            return InsertResult()
+
+        result = await self.insert_batches(self.old_pool, news_items, is_old_format=True)
+        logger.debug(f"Новости старого формата: поступило {result.total}, вставлено {result.inserted}, "
+                     f"уже были в базе {result.duplicates}, не удалось вставить {result.failed}")
+        return result
@@ -0,0 +1,19 @@
+"""
+Пересчёт водяных знаков агентств по таблице news.
+Rebuilds agency watermarks from the news table.
+
+Запуск из каталога tandem-collector | Run from the tandem-collector directory:
+    python -m db.rebuild_watermarks
+"""
+import asyncio
+
+from db.database import DatabaseManager
+
+
+async def rebuild():
+    async with DatabaseManager() as db_manager:
+        await db_manager.rebuild_watermarks()
+
+
+if __name__ == '__main__':
+    asyncio.run(rebuild())
@@ -0,0 +1,45 @@
+import struct
+from typing import Sequence, Union
+
+import numpy as np
+
+# Двоичный формат pgvector: размерность (uint16), зарезервированное поле (uint16), затем float32, всё big-endian
+HEADER = struct.Struct('>HH')
+WIRE_DTYPE = np.dtype('>f4')
+
+Vector = Union[np.ndarray, Sequence[float]]
+
+
+def encode_vector(value: Vector) -> bytes:
+    """
+    Кодирует вектор (массив numpy или список чисел) в двоичный формат pgvector.
+    Encodes a vector (numpy array or list of numbers) into the pgvector binary format.
+    """
+    array = np.asarray(value, dtype=WIRE_DTYPE)
+    if array.ndim != 1:
+        raise ValueError(f'Ожидался одномерный вектор, получен массив формы {array.shape}')
+    return HEADER.pack(array.shape[0], 0) + array.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """
+    Декодирует вектор pgvector в массив float32.
+    Decodes a pgvector vector into a float32 array.
+    """
+    dim, _ = HEADER.unpack_from(data)
+    return np.frombuffer(data, dtype=WIRE_DTYPE, count=dim, offset=HEADER.size).astype(np.float32)
+
+
+async def register_vector_codec(conn):
+    """
+    Регистрирует на соединении asyncpg двоичный кодек типа vector: эмбеддинги передаются
+    без JSON и без разбора текста на стороне Postgres. Используется как init пула.
+    Registers the binary vector codec on an asyncpg connection: embeddings travel without
+    JSON and without text parsing on the Postgres side. Used as the pool init.
+    """
+    schema = await conn.fetchval("""
+        SELECT n.nspname FROM pg_type t JOIN pg_namespace n ON n.oid = t.typnamespace WHERE t.typname = 'vector'
+    """)
+    if schema is None:
+        raise RuntimeError('В базе не установлено расширение pgvector (тип vector не найден)')
+    await conn.set_type_codec('vector', schema=schema, encoder=encode_vector, decoder=decode_vector, format='binary')
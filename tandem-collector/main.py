@@ -1,66 +1,160 @@
 import asyncio
+import contextlib
 from datetime import datetime
+from typing import Optional
 from loguru import logger
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from db.database import DatabaseManager
+from news.cache import ENRICHMENT_CACHE_PATH, EnrichmentCache
+from news.journal import WORK_QUEUE_PATH, WorkQueue
+from news.dedup import DEDUP_WINDOW_HOURS, NearDuplicateIndex
 from news.processor import NewsProcessor
+from news.repair import EMBEDDING_REPAIR_PATH, EmbeddingRepairWorker
+from news.scheduler import POLL_MODE, PollingScheduler
+from news.leases import AGENCY_LEASE_SECONDS, AgencyLeases
 from news.parser import NewsParser
-from api.client import NewsAPIClient
+from news.fetcher import TelegramFetcher
+from api.client import GENERATION_BACKEND, NewsAPIClient
+from api.executor import InferenceExecutor
+from api.registry import registry
+from monitoring.metrics import RUN_ITEMS, RUN_SECONDS, start_metrics_server
 
 
-async def process_news():
+async def process_news(db_manager: DatabaseManager, fetcher: TelegramFetcher, executor: InferenceExecutor,
+                       dedup: NearDuplicateIndex, cache: Optional[EnrichmentCache], journal: Optional[WorkQueue],
+                       repair: Optional[EmbeddingRepairWorker], leases: Optional[AgencyLeases],
+                       agencies: Optional[list[str]] = None):
     """
-    Основная функция для обработки новостей.
-    Main function for news processing.
+    Основная функция для обработки новостей: всех агентств или только перечисленных в agencies.
+    Main function for news processing: of all agencies or only of those listed in agencies.
     """
     start_date = datetime.now()
 
-    async with DatabaseManager() as db_manager:
-        # Получение свежего словаря новостных агентств
-        # Get the latest dictionary of news agencies
-        agencies_dict = await db_manager.get_last_agencies_dict()
-        logger.info('Получен статус последних новостей в базе данных')
+    await db_manager.health_check()
+    # Получение свежего словаря новостных агентств
+    # Get the latest dictionary of news agencies
+    agencies_dict = await db_manager.get_last_agencies_dict()
+    if agencies is not None:
+        agencies_dict = {agency: last_id for agency, last_id in agencies_dict.items() if agency in agencies}
+    logger.info('Получен статус последних новостей в базе данных')
 
-    async with NewsAPIClient() as api_client:
-        parser = NewsParser(api_client)
-        processor = NewsProcessor(parser)
-        fresh_news, fresh_old_news = await processor.process_agencies(agencies_dict)
+    # Несколько экземпляров сборщика обрабатывают только арендованные ими агентства
+    held = leases.hold(agencies_dict) if leases is not None else contextlib.nullcontext(set(agencies_dict))
+    # Досчёт эмбеддингов не отправляет запросы к API, пока идёт сбор
+    async with NewsAPIClient(executor=executor) as api_client, repair.ingest() if repair else contextlib.nullcontext(), \
+            held as leased:
+        agencies_dict = {agency: last_id for agency, last_id in agencies_dict.items() if agency in leased}
+        if not agencies_dict:
+            logger.info('Нет арендованных агентств для обработки')
+            return
+        parser = NewsParser(api_client, fetcher)
+        processor = NewsProcessor(parser, db_manager, dedup, cache, journal, leases)
+        # Новости записываются в обе базы данных по мере обработки агентств
+        result, old_result = await processor.process_agencies(agencies_dict)
+    fetcher.report()
 
-    if not fresh_news:
+    if not result.total:
         logger.warning('Не было получено новостей')
     else:
-        async with DatabaseManager() as db_manager:
-            # Запись в новую базу данных
-            total_count = await db_manager.insert_news_items(fresh_news)
-            # Запись в старую базу данных
-            total_old_count = await db_manager.insert_old_news_items(fresh_old_news)
-
         end_date = datetime.now()
         total_seconds = (end_date - start_date).total_seconds()
         minutes, seconds = divmod(total_seconds, 60)
         logger.info(f'Время выполнения {int(minutes)} минут и {int(seconds)} секунд')
-        total_news = total_count + total_old_count
+        total_news = result.total + old_result.total
         logger.info(f'Средняя скорость обработки одной новости: {(total_seconds / total_news):.2f} секунд')
 
+    RUN_SECONDS.observe((datetime.now() - start_date).total_seconds())
+    RUN_ITEMS.observe(result.total)
+    logger.info(f'Состояние пулов базы данных: {db_manager.pool_stats()}')
 
-def main():
+
+async def run_scheduler():
     """
-    Главная функция для запуска процесса сбора новостей по расписанию.
-    Main function to start the news collection process on schedule.
+    Запускает сбор новостей сразу и затем по расписанию, сохраняя пулы базы данных,
+    HTTP-клиент и пул инференса между запусками.
+    Runs news collection immediately and then on schedule, keeping the database pools,
+    HTTP client and inference pool between runs.
     """
+    start_metrics_server()
+
+    if GENERATION_BACKEND != 'remote':
+        # Локальные модели генерации нужны только без удалённого API; их загрузка требует transformers
+        import api.services  # noqa: F401
+    warm_up = registry.warm_up_names()
+    if warm_up:
+        logger.info(f'Прогрев моделей: {", ".join(warm_up)}')
+        await asyncio.to_thread(registry.warm_up, warm_up)
+
+    async with DatabaseManager() as db_manager, TelegramFetcher() as fetcher, InferenceExecutor() as executor, \
+            NewsAPIClient() as repair_client:
+        # Индекс почти-дубликатов живёт между запусками и восстанавливается из базы при старте
+        dedup = NearDuplicateIndex()
+        recent_news = await db_manager.get_recent_news(DEDUP_WINDOW_HOURS)
+        await asyncio.to_thread(dedup.load, recent_news)
+
+        cache = EnrichmentCache() if ENRICHMENT_CACHE_PATH else None
+        # Журнал этапов: новости упавшего запуска продолжают обработку с последнего пройденного этапа
+        journal = WorkQueue() if WORK_QUEUE_PATH else None
+        # Фоновый досчёт эмбеддингов для новостей, сохранённых без них
+        repair = EmbeddingRepairWorker(repair_client, db_manager) if EMBEDDING_REPAIR_PATH else None
+        repair_task = asyncio.create_task(repair.serve()) if repair else None
+        # Аренда агентств для работы нескольких экземпляров с одной базой
+        leases = AgencyLeases(db_manager) if AGENCY_LEASE_SECONDS else None
+        leases_task = None
+        if leases is not None:
+            await leases.renew()
+            leases_task = asyncio.create_task(leases.serve())
+
+        try:
+            if POLL_MODE == 'cron':
+                await run_cron(db_manager, fetcher, executor, dedup, cache, journal, repair, leases)
+            else:
+                # Каждое агентство опрашивается со своим интервалом в пределах общего бюджета
+                polling = PollingScheduler(
+                    db_manager,
+                    lambda agencies: process_news(db_manager, fetcher, executor, dedup, cache, journal, repair, leases,
+                                                  agencies),
+                    leases=leases
+                )
+                await polling.serve()
+        finally:
+            for task in (repair_task, leases_task):
+                if task:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+            if cache:
+                cache.close()
+            if journal is not None:
+                journal.close()
+
+
+async def run_cron(*args):
+    """
+    Прежний режим: обработка всех агентств сразу и затем в начале каждого часа.
+    Previous mode: processes all agencies immediately and then at the top of every hour.
+    """
+    await process_news(*args)
+
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(process_news, 'cron', minute=0)
+    scheduler.add_job(process_news, 'cron', minute=0, args=list(args))
     scheduler.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        scheduler.shutdown(wait=False)
+
 
+def main():
+    """
+    Главная функция для запуска процесса сбора новостей по расписанию.
+    Main function to start the news collection process on schedule.
+    """
     try:
-        asyncio.get_event_loop().run_forever()
+        asyncio.run(run_scheduler())
     except (KeyboardInterrupt, SystemExit):
         pass
 
 
 if __name__ == '__main__':
-    asyncio.run(process_news())
-    # Раскомментировать для запуска по расписанию
-    asyncio.set_event_loop(asyncio.new_event_loop())
     main()
@@ -1,5 +1,22 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PlainSerializer, PlainValidator
 from datetime import datetime
+from typing import Annotated
+
+import numpy as np
+
+
+def as_embedding(value) -> np.ndarray:
+    """Приводит эмбеддинг к непрерывному массиву float32 без копирования, если он уже такой."""
+    return np.ascontiguousarray(value, dtype=np.float32)
+
+
+# Эмбеддинг хранится массивом float32 (768 * 4 байта вместо 768 объектов float);
+# в список чисел он превращается только при сериализации в JSON, например для журнала обработки
+Embedding = Annotated[
+    np.ndarray,
+    PlainValidator(as_embedding),
+    PlainSerializer(lambda value: value.tolist(), return_type=list[float], when_used='json')
+]
 
 
 class NewsItem(BaseModel):
@@ -10,7 +27,7 @@ class NewsItem(BaseModel):
     agency: str
     title: str = ""
     resume: str = ""
-    embedding: list[float] = []
+    embedding: Embedding = Field(default_factory=lambda: np.empty(0, dtype=np.float32))
     category: str = ""
 
 class OldNewsItem(BaseModel):
@@ -0,0 +1,75 @@
+import os
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from loguru import logger
+
+# Порт HTTP-эндпоинта метрик в формате Prometheus (0 отключает эндпоинт)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9200))
+
+# Границы корзин: от миллисекунд (разбор, кэш) до минут (генерация, догрузка истории)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+# Длительность целого запуска: от быстрых адаптивных опросов до часовых запусков по cron
+RUN_BUCKETS = (5, 10, 20, 30, 60, 120, 180, 300, 450, 600, 900, 1200, 1800, 2700, 3600)
+
+# Загрузка страниц t.me
+FETCH_SECONDS = Histogram(
+    'collector_fetch_seconds', 'Время загрузки страницы канала', ['agency', 'kind'], buckets=LATENCY_BUCKETS
+)
+FETCH_PAGES = Counter(
+    'collector_fetch_pages_total', 'Загруженные страницы каналов по результату', ['agency', 'result']
+)
+# Разбор и очистка
+EXTRACT_SECONDS = Histogram(
+    'collector_extract_seconds', 'Время извлечения сообщений из HTML страницы', ['extractor'], buckets=LATENCY_BUCKETS
+)
+CLEAN_SECONDS = Histogram(
+    'collector_clean_seconds', 'Время запроса пакетной очистки текстов', ['status'], buckets=LATENCY_BUCKETS
+)
+CLEAN_TEXTS = Counter('collector_clean_texts_total', 'Тексты, отправленные на очистку')
+# Модели обогащения
+MODEL_SECONDS = Histogram(
+    'collector_model_seconds', 'Время вызова модели на пакет новостей', ['model'], buckets=LATENCY_BUCKETS
+)
+MODEL_ITEMS = Counter('collector_model_items_total', 'Новости, обработанные моделью', ['model'])
+MODEL_TOKENS = Counter(
+    'collector_model_tokens_total', 'Токены локальных моделей генерации', ['model', 'direction']
+)
+GENERATION_REQUESTS = Counter(
+    'collector_generation_requests_total', 'Пакеты генерации, отправленные в API, по результату', ['model', 'result']
+)
+# Запись в базы данных
+DB_INSERT_SECONDS = Histogram(
+    'collector_db_insert_seconds', 'Время записи пакета новостей в базу', ['db'], buckets=LATENCY_BUCKETS
+)
+DB_ROWS = Counter('collector_db_rows_total', 'Строки, переданные на запись, по результату', ['db', 'result'])
+# Конвейер
+STAGE_SECONDS = Histogram(
+    'collector_stage_seconds', 'Время обработки пакета на этапе конвейера', ['stage'], buckets=LATENCY_BUCKETS
+)
+STAGE_BLOCKED_SECONDS = Counter(
+    'collector_stage_blocked_seconds_total', 'Время ожидания бюджета и очереди следующего этапа', ['stage']
+)
+STAGE_ITEMS = Counter(
+    'collector_stage_items_total', 'Единицы работы (новости, для fetch — страницы), прошедшие этап конвейера',
+    ['stage', 'agency']
+)
+STAGE_FAILURES = Counter('collector_stage_failures_total', 'Ошибки на этапе конвейера', ['stage', 'agency'])
+QUEUE_DEPTH = Gauge('collector_queue_depth', 'Пакеты в очереди перед этапом конвейера', ['stage'])
+INFLIGHT_ITEMS = Gauge('collector_inflight_items', 'Новости, разобранные, но ещё не записанные в базу')
+# Досчёт пропущенных эмбеддингов
+REPAIR_ITEMS = Counter('collector_repair_items_total', 'Новости, обработанные досчётом эмбеддингов', ['result'])
+REPAIR_BACKLOG = Gauge('collector_repair_backlog', 'Новости без эмбеддингов по последней проверке')
+# Запуски
+RUN_SECONDS = Histogram('collector_run_seconds', 'Длительность запуска обработки', buckets=RUN_BUCKETS)
+RUN_ITEMS = Histogram('collector_run_items', 'Новости, собранные за запуск', buckets=SIZE_BUCKETS)
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """
+    Запускает HTTP-эндпоинт /metrics в фоновом потоке.
+    Starts the /metrics HTTP endpoint in a background thread.
+    """
+    if not port:
+        return
+    start_http_server(port)
+    logger.info(f'Метрики Prometheus доступны на порту {port}')
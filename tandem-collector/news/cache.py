@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+from loguru import logger
+
+# Файл кэша результатов моделей (пустое значение отключает кэш), предельное число записей
+# и версия кэша: её смена делает недействительными все сохранённые результаты
+ENRICHMENT_CACHE_PATH = os.getenv("ENRICHMENT_CACHE_PATH", "data/enrichment_cache.sqlite")
+ENRICHMENT_CACHE_MAX_ENTRIES = int(os.getenv("ENRICHMENT_CACHE_MAX_ENTRIES", 200_000))
+ENRICHMENT_CACHE_VERSION = os.getenv("ENRICHMENT_CACHE_VERSION", "1")
+
+# Модели, чьи результаты — векторы, а не строки
+VECTOR_MODELS = {'embedding'}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS enrichment_cache (
+        key BLOB PRIMARY KEY,
+        model TEXT NOT NULL,
+        value BLOB NOT NULL,
+        used_at REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS enrichment_cache_used_at ON enrichment_cache (used_at);
+"""
+
+
+class EnrichmentCache:
+    """
+    Кэш результатов моделей обогащения на диске (SQLite) с ключом по хэшу идентификатора модели
+    (имя и бэкенд) и очищенного текста: смена модели или бэкенда не отдаёт результаты прежней.
+    On-disk (SQLite) cache of enrichment model results keyed by a hash of the model identifier
+    (name and backend) and the cleaned text: switching the model or backend never serves the old results.
+
+    Отредактированные, повторно загруженные после неудачной вставки или обработанные заново после
+    сбоя новости не проходят через модели повторно. При превышении max_entries вытесняются записи,
+    которые дольше всего не использовались.
+    Edited news, news re-fetched after a failed insert or reprocessed after a crash do not go through
+    the models again. Above max_entries the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str = ENRICHMENT_CACHE_PATH, max_entries: int = ENRICHMENT_CACHE_MAX_ENTRIES,
+                 version: str = ENRICHMENT_CACHE_VERSION):
+        self.path = path
+        self.max_entries = max_entries
+        self.version = version
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._size = self._conn.execute('SELECT COUNT(*) FROM enrichment_cache').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def key(self, model_id: str, text: str) -> bytes:
+        return hashlib.sha256(f'{model_id}:{self.version}\n{text}'.encode()).digest()
+
+    @staticmethod
+    def encode(model: str, value: Any) -> bytes:
+        if model in VECTOR_MODELS:
+            return np.asarray(value, dtype=np.float32).tobytes()
+        return value.encode()
+
+    @staticmethod
+    def decode(model: str, value: bytes) -> Any:
+        if model in VECTOR_MODELS:
+            return np.frombuffer(value, dtype=np.float32)
+        return value.decode()
+
+    def get_many(self, model: str, texts: list[str], model_id: Optional[str] = None) -> list[Optional[Any]]:
+        """
+        Результаты модели для текстов; None для отсутствующих в кэше. model — назначение модели
+        (embedding, summary, ...) для статистики и формата значений, model_id — её идентификатор в ключе.
+        Model results for the texts; None for texts missing from the cache. model is the model purpose
+        (embedding, summary, ...) for stats and the value format, model_id is its identifier in the key.
+        """
+        keys = [self.key(model_id or model, text) for text in texts]
+        with self._lock:
+            rows = dict(self._conn.execute(
+                f'SELECT key, value FROM enrichment_cache WHERE key IN ({", ".join("?" * len(keys))})', keys
+            ).fetchall()) if keys else {}
+            if rows:
+                now = time.time()
+                self._conn.execute('BEGIN')
+                self._conn.executemany('UPDATE enrichment_cache SET used_at = ? WHERE key = ?',
+                                       [(now, key) for key in rows])
+                self._conn.execute('COMMIT')
+        found = [self.decode(model, rows[key]) if key in rows else None for key in keys]
+        missing = sum(value is None for value in found)
+        self.hits[model] += len(texts) - missing
+        self.misses[model] += missing
+        return found
+
+    def put_many(self, model: str, texts: list[str], values: list[Any], model_id: Optional[str] = None):
+        """Сохраняет результаты модели и вытесняет давно не использованные записи."""
+        now = time.time()
+        rows = {
+            self.key(model_id or model, text): (model, self.encode(model, value), now)
+            for text, value in zip(texts, values)
+        }
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute('BEGIN')
+            existing = self._conn.execute(
+                f'SELECT COUNT(*) FROM enrichment_cache WHERE key IN ({", ".join("?" * len(rows))})', list(rows)
+            ).fetchone()[0]
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO enrichment_cache (key, model, value, used_at) VALUES (?, ?, ?, ?)',
+                [(key, *row) for key, row in rows.items()]
+            )
+            self._size += len(rows) - existing
+            if self._size > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM enrichment_cache WHERE key IN '
+                    '(SELECT key FROM enrichment_cache ORDER BY used_at LIMIT ?)', (self._size - self.max_entries,)
+                )
+                self._size = self.max_entries
+            self._conn.execute('COMMIT')
+
+    async def cached(self, model: str, texts: list[str],
+                     compute: Callable[[list[str]], Awaitable[list[Any]]], model_id: Optional[str] = None) -> list[Any]:
+        """
+        Возвращает результаты модели из кэша, вызывая compute только для промахов.
+        Returns model results from the cache, calling compute only for the misses.
+        """
+        results = await asyncio.to_thread(self.get_many, model, texts, model_id)
+        missing = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+        if missing:
+            computed = dict(zip(missing, await compute(missing)))
+            await asyncio.to_thread(self.put_many, model, missing, [computed[text] for text in missing], model_id)
+            results = [computed[text] if result is None else result for text, result in zip(texts, results)]
+        return results
+
+    def hit_rates(self) -> dict[str, float]:
+        return {
+            model: self.hits[model] / (self.hits[model] + self.misses[model])
+            for model in sorted(self.hits.keys() | self.misses.keys())
+        }
+
+    def report(self):
+        """Логирует долю попаданий в кэш по каждой модели."""
+        rates = ', '.join(
+            f'{model} {rate:.0%} ({self.hits[model]}/{self.hits[model] + self.misses[model]})'
+            for model, rate in self.hit_rates().items()
+        )
+        logger.info(f'Кэш обогащения: {self._size} записей, попадания: {rates or "нет запросов"}')
@@ -0,0 +1,227 @@
+import hashlib
+import os
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Union
+
+import numpy as np
+from loguru import logger
+
+from models.news_item import NewsItem
+
+# Окно поиска почти-дубликатов, минимальная оценка сходства Жаккара по словам
+# и минимальное число слов в тексте, при котором сигнатура считается надёжной
+DEDUP_WINDOW_HOURS = float(os.getenv("DEDUP_WINDOW_HOURS", 24))
+DEDUP_MIN_SIMILARITY = float(os.getenv("DEDUP_MIN_SIMILARITY", 0.7))
+DEDUP_MIN_TOKENS = int(os.getenv("DEDUP_MIN_TOKENS", 10))
+
+# 64 хэш-функции MinHash, разбитые на 16 полос по 4 значения
+SIGNATURE_SIZE = 64
+BAND_ROWS = 4
+# Вызовы моделей на одну новость: эмбеддинг, категория, резюме, заголовок
+MODELS_PER_ITEM = 4
+
+WORD_PATTERN = re.compile(r'\w+')
+NUMBER_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+
+_rng = np.random.default_rng(20240901)
+_MULTIPLIERS = _rng.integers(1, 2 ** 63, SIGNATURE_SIZE, dtype=np.uint64) | np.uint64(1)
+_OFFSETS = _rng.integers(0, 2 ** 63, SIGNATURE_SIZE, dtype=np.uint64)
+
+
+def minhash(text: str, min_tokens: int = DEDUP_MIN_TOKENS) -> Optional[np.ndarray]:
+    """
+    MinHash-сигнатура множества слов текста; None для слишком коротких текстов.
+    MinHash signature of the text word set; None for texts that are too short.
+    """
+    tokens = WORD_PATTERN.findall(text.lower())
+    if len(tokens) < min_tokens:
+        return None
+    words = set(tokens)
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), 'little') for word in words),
+        dtype=np.uint64, count=len(words)
+    )
+    # Хэширование умножением со сдвигом: переполнение uint64 здесь намеренное
+    permuted = (hashes[:, None] * _MULTIPLIERS + _OFFSETS) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def numbers(text: str) -> frozenset[str]:
+    """
+    Числа текста: новости с разными числами (курсы, счёт, число пострадавших) не считаются дубликатами.
+    Numbers of the text: news with different numbers (rates, scores, casualties) are not duplicates.
+    """
+    return frozenset(NUMBER_PATTERN.findall(text))
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Оценка сходства Жаккара по двум сигнатурам."""
+    return float(np.count_nonzero(a == b)) / SIGNATURE_SIZE
+
+
+@dataclass(eq=False)
+class CanonicalNews:
+    """
+    Обогащённая новость окна, чьи результаты переиспользуются её почти-дубликатами.
+    An enriched news item of the window whose results are reused by its near-duplicates.
+    """
+    url: str
+    date: datetime
+    signature: np.ndarray
+    numbers: frozenset[str]
+    title: str
+    resume: str
+    category: str
+    embedding: np.ndarray
+
+    @classmethod
+    def from_news_item(cls, item: NewsItem, signature: np.ndarray) -> 'CanonicalNews':
+        return cls(
+            url=item.url,
+            date=item.date.replace(tzinfo=None),
+            signature=signature,
+            numbers=numbers(item.news),
+            title=item.title,
+            resume=item.resume,
+            category=item.category,
+            embedding=item.embedding
+        )
+
+    def copy_to(self, item: NewsItem):
+        item.title = self.title
+        item.resume = self.resume
+        item.category = self.category
+        item.embedding = self.embedding
+
+
+@dataclass
+class DedupPlan:
+    """
+    Разбиение пакета на новости для обогащения и почти-дубликаты с их источниками.
+    Split of a batch into news to enrich and near-duplicates with their sources.
+
+    Источник дубликата — новость окна или более ранняя новость того же пакета.
+    A duplicate's source is either a window news item or an earlier item of the same batch.
+    """
+    unique: list[NewsItem] = field(default_factory=list)
+    duplicates: list[tuple[NewsItem, Union[CanonicalNews, NewsItem]]] = field(default_factory=list)
+    signatures: dict[str, np.ndarray] = field(default_factory=dict)
+
+
+class NearDuplicateIndex:
+    """
+    Индекс MinHash-сигнатур обогащённых новостей за скользящее окно.
+    MinHash index of enriched news over a sliding time window.
+
+    Сигнатура делится на полосы (LSH): кандидаты ищутся по точному совпадению хотя бы одной
+    полосы, а не перебором всего окна, и принимаются при оценке сходства не ниже min_similarity.
+    The signature is split into bands (LSH): candidates are found by an exact match of at least
+    one band instead of scanning the whole window, and accepted when their estimated similarity
+    is at least min_similarity.
+    """
+
+    def __init__(self, window_hours: float = DEDUP_WINDOW_HOURS, min_similarity: float = DEDUP_MIN_SIMILARITY,
+                 min_tokens: int = DEDUP_MIN_TOKENS):
+        self.window = timedelta(hours=window_hours)
+        self.min_similarity = min_similarity
+        self.min_tokens = min_tokens
+        self._entries: deque[CanonicalNews] = deque()
+        self._buckets: dict[tuple[int, bytes], list[CanonicalNews]] = {}
+        self._newest: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _keys(signature: np.ndarray) -> list[tuple[int, bytes]]:
+        return [(band, signature[start:start + BAND_ROWS].tobytes())
+                for band, start in enumerate(range(0, SIGNATURE_SIZE, BAND_ROWS))]
+
+    def add(self, entry: CanonicalNews):
+        """Добавляет обогащённую новость в окно и вытесняет устаревшие."""
+        self._entries.append(entry)
+        for key in self._keys(entry.signature):
+            self._buckets.setdefault(key, []).append(entry)
+        if self._newest is None or entry.date > self._newest:
+            self._newest = entry.date
+        self._evict()
+
+    def _evict(self):
+        # Новости поступают почти по порядку дат, поэтому достаточно проверять начало очереди
+        horizon = self._newest - self.window
+        while self._entries and self._entries[0].date < horizon:
+            entry = self._entries.popleft()
+            for key in self._keys(entry.signature):
+                bucket = self._buckets[key]
+                bucket.remove(entry)
+                if not bucket:
+                    del self._buckets[key]
+
+    def find(self, signature: np.ndarray, text_numbers: frozenset[str]) -> Optional[CanonicalNews]:
+        """Самая похожая новость окна с теми же числами и сходством не ниже min_similarity."""
+        candidates = {id(entry): entry for key in self._keys(signature) for entry in self._buckets.get(key, ())}
+        best, best_similarity = None, self.min_similarity
+        for entry in candidates.values():
+            if entry.numbers != text_numbers:
+                continue
+            score = similarity(entry.signature, signature)
+            if score >= best_similarity:
+                best, best_similarity = entry, score
+        return best
+
+    def load(self, records: Iterable[NewsItem]) -> int:
+        """
+        Заполняет окно уже обогащёнными новостями из базы (при старте планировщика).
+        Fills the window with already enriched news from the database (on scheduler startup).
+        """
+        for item in sorted(records, key=lambda record: record.date):
+            signature = minhash(item.news, self.min_tokens)
+            if signature is not None:
+                self.add(CanonicalNews.from_news_item(item, signature))
+        logger.info(f'Индекс почти-дубликатов: {len(self)} новостей за {self.window}')
+        return len(self)
+
+    def plan(self, items: list[NewsItem]) -> DedupPlan:
+        """
+        Находит почти-дубликаты пакета среди новостей окна и более ранних новостей пакета.
+        Finds the batch near-duplicates among window news and earlier news of the batch.
+        """
+        plan = DedupPlan()
+        batch: list[tuple[np.ndarray, frozenset[str], NewsItem]] = []
+        for item in items:
+            signature = minhash(item.news, self.min_tokens)
+            if signature is None:
+                plan.unique.append(item)
+                continue
+            text_numbers = numbers(item.news)
+            source = self.find(signature, text_numbers) or next(
+                (earlier for earlier_signature, earlier_numbers, earlier in batch
+                 if earlier_numbers == text_numbers
+                 and similarity(earlier_signature, signature) >= self.min_similarity), None
+            )
+            if source is None:
+                plan.unique.append(item)
+                plan.signatures[item.url] = signature
+                batch.append((signature, text_numbers, item))
+            else:
+                plan.duplicates.append((item, source))
+        return plan
+
+    def commit(self, plan: DedupPlan):
+        """
+        Добавляет обогащённые новости пакета в окно и копирует их результаты дубликатам.
+        Adds the enriched batch news to the window and copies their results to the duplicates.
+        """
+        canonical = {}
+        for item in plan.unique:
+            signature = plan.signatures.get(item.url)
+            if signature is not None:
+                canonical[item.url] = CanonicalNews.from_news_item(item, signature)
+                self.add(canonical[item.url])
+        for item, source in plan.duplicates:
+            if isinstance(source, NewsItem):
+                source = canonical[source.url]
+            source.copy_to(item)
@@ -0,0 +1,129 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+
+# Бэкенд разбора страниц каналов: lxml (скомпилированные XPath) или soup (BeautifulSoup)
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "lxml")
+
+
+@dataclass
+class RawMessage:
+    """
+    Сообщение канала в том виде, в каком оно извлечено из HTML.
+    A channel message as extracted from the HTML.
+    """
+    message_id: int
+    url: str
+    datetime: Optional[str] = None
+    # Текст сообщения; None, если у сообщения нет текста (например, только фото)
+    text: Optional[str] = None
+    # Первая ссылка в тексте сообщения
+    href: Optional[str] = None
+
+
+def message_id(url: str) -> int:
+    """Номер сообщения в канале из его URL."""
+    return int(url.split('/')[-1])
+
+
+class HtmlExtractor:
+    """
+    Интерфейс извлечения сообщений со страницы t.me/s/{agency}.
+    Interface for extracting messages from a t.me/s/{agency} page.
+    """
+    name = ''
+
+    def extract(self, html: str) -> dict[int, RawMessage]:
+        """
+        Возвращает сообщения страницы по их номерам.
+        Returns the page messages keyed by message id.
+        """
+        raise NotImplementedError
+
+
+class SoupExtractor(HtmlExtractor):
+    """Исходная реализация на BeautifulSoup."""
+    name = 'soup'
+
+    def extract(self, html: str) -> dict[int, RawMessage]:
+        soup = BeautifulSoup(html, 'lxml')
+        try:
+            bubbles = soup.body.main.section.find_all(attrs={'class': 'tgme_widget_message_bubble'})
+        except AttributeError:
+            return {}
+
+        messages = {}
+        for bubble in bubbles:
+            date_tag = bubble.find(attrs={'class': 'tgme_widget_message_date'})
+            url = date_tag.get('href') if date_tag else None
+            if not url:
+                continue
+            time_tag = bubble.find(attrs={'class': 'time'})
+            text_tag = bubble.find(attrs={'class': 'tgme_widget_message_text js-message_text'})
+            tag_a = text_tag.find('a') if text_tag else None
+            messages[message_id(url)] = RawMessage(
+                message_id=message_id(url),
+                url=url,
+                datetime=time_tag.get('datetime') if time_tag else None,
+                text=text_tag.text if text_tag else None,
+                href=tag_a.get('href') if tag_a else None
+            )
+        return messages
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlExtractor(HtmlExtractor):
+    """
+    Реализация на lxml с заранее скомпилированными XPath-выражениями: дерево строится
+    средствами libxml2 без объектной модели BeautifulSoup.
+    lxml implementation with precompiled XPath expressions: the tree is built by libxml2
+    without the BeautifulSoup object model.
+    """
+    name = 'lxml'
+
+    # Повторяет soup.body.main.section.find_all(class="tgme_widget_message_bubble")
+    bubbles = etree.XPath(f"((((//body)[1]//main)[1]//section)[1]//*[{_has_class('tgme_widget_message_bubble')}])")
+    date_href = etree.XPath(f"(.//*[{_has_class('tgme_widget_message_date')}])[1]/@href")
+    time_datetime = etree.XPath(f"(.//*[{_has_class('time')}])[1]/@datetime")
+    text_node = etree.XPath("(.//*[@class='tgme_widget_message_text js-message_text'])[1]")
+    first_href = etree.XPath("(.//a)[1]/@href")
+
+    def extract(self, html: str) -> dict[int, RawMessage]:
+        try:
+            root = lxml_html.document_fromstring(html)
+        except (etree.ParserError, ValueError):
+            return {}
+
+        messages = {}
+        for bubble in self.bubbles(root):
+            urls = self.date_href(bubble)
+            if not urls or not urls[0]:
+                continue
+            url = str(urls[0])
+            datetimes = self.time_datetime(bubble)
+            text_nodes = self.text_node(bubble)
+            text_node = text_nodes[0] if text_nodes else None
+            hrefs = self.first_href(text_node) if text_node is not None else []
+            messages[message_id(url)] = RawMessage(
+                message_id=message_id(url),
+                url=url,
+                datetime=str(datetimes[0]) if datetimes else None,
+                text=text_node.text_content() if text_node is not None else None,
+                href=str(hrefs[0]) if hrefs else None
+            )
+        return messages
+
+
+EXTRACTORS = {extractor.name: extractor for extractor in (SoupExtractor, LxmlExtractor)}
+
+
+def get_extractor(name: str = HTML_EXTRACTOR) -> HtmlExtractor:
+    if name not in EXTRACTORS:
+        raise ValueError(f'Неизвестный бэкенд разбора HTML: {name}')
+    return EXTRACTORS[name]()
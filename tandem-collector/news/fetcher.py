@@ -0,0 +1,286 @@
+import aiohttp
+import asyncio
+import hashlib
+import os
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from loguru import logger
+
+from monitoring.metrics import FETCH_PAGES, FETCH_SECONDS
+
+TELEGRAM_URL = os.getenv("TELEGRAM_URL", "https://t.me")
+# Ограничения пула соединений и время жизни кэша DNS
+FETCH_LIMIT = int(os.getenv("FETCH_LIMIT", 32))
+FETCH_LIMIT_PER_HOST = int(os.getenv("FETCH_LIMIT_PER_HOST", 8))
+FETCH_DNS_TTL = int(os.getenv("FETCH_DNS_TTL", 600))
+FETCH_TIMEOUT = int(os.getenv("FETCH_TIMEOUT", 60))
+# Общий для всех агентств лимит запросов к t.me в секунду и допустимый всплеск (0 отключает лимит)
+FETCH_RATE = float(os.getenv("FETCH_RATE", 5))
+FETCH_BURST = int(os.getenv("FETCH_BURST", 10))
+# Повторы при 429, 5xx и сетевых ошибках: число повторов, база и потолок экспоненциальной паузы, секунды
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", 4))
+FETCH_BACKOFF_BASE = float(os.getenv("FETCH_BACKOFF_BASE", 1))
+FETCH_BACKOFF_MAX = float(os.getenv("FETCH_BACKOFF_MAX", 60))
+
+# Ответы, после которых запрос повторяется
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """
+    Страницу канала не удалось загрузить: статус ответа не 200/304 или кончились повторы.
+    The channel page could not be downloaded: a non-200/304 status or retries ran out.
+    """
+
+    def __init__(self, agency: str, status: Optional[int], message: str):
+        super().__init__(f'{agency}: {message}')
+        self.agency = agency
+        self.status = status
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов «ведро токенов», общий для всех агентств.
+    Token-bucket request rate limiter shared by all agencies.
+
+    Ответ 429 приостанавливает всё ведро на время Retry-After: остальные агентства
+    тоже ждут, а не продолжают упираться в лимит Telegram.
+    A 429 response pauses the whole bucket for Retry-After: the other agencies
+    wait too instead of hitting the Telegram limit again.
+    """
+
+    def __init__(self, rate: float = FETCH_RATE, capacity: int = FETCH_BURST):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Ждёт свободного токена; ожидающие обслуживаются по очереди."""
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Приостанавливает выдачу токенов на seconds секунд."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+@dataclass
+class ChannelPage:
+    """
+    Результат загрузки страницы канала.
+    Result of a channel page download.
+    """
+    agency: str
+    html: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    not_modified: bool = False
+
+
+@dataclass
+class PageValidators:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: Optional[str]
+    # id самой свежей текстовой новости, которая была на странице
+    newest_id: int
+
+
+class PageCache:
+    """
+    Кэш валидаторов страниц каналов (ETag, Last-Modified, хэш содержимого).
+    Cache of channel page validators (ETag, Last-Modified, content hash).
+
+    Страница считается неизменившейся только если все её новости уже есть в базе,
+    т.е. newest_id не больше last_id: так недописанные в базу новости не теряются.
+    A page is only treated as unchanged when all of its news are already stored,
+    i.e. newest_id is not greater than last_id, so news that never reached the DB are not lost.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, PageValidators] = {}
+
+    def _fresh_entry(self, agency: str, last_id: int) -> Optional[PageValidators]:
+        entry = self._entries.get(agency)
+        return entry if entry and entry.newest_id <= last_id else None
+
+    def conditional_headers(self, agency: str, last_id: int) -> dict[str, str]:
+        """Заголовки условного запроса для агентства."""
+        entry = self._fresh_entry(agency, last_id)
+        headers = {}
+        if entry and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def is_unchanged(self, agency: str, last_id: int, content_hash: str) -> bool:
+        """Проверяет, совпадает ли содержимое страницы с уже обработанным."""
+        entry = self._fresh_entry(agency, last_id)
+        return entry is not None and entry.content_hash == content_hash
+
+    def remember(self, page: ChannelPage, newest_id: int):
+        """Запоминает валидаторы разобранной страницы."""
+        self._entries[page.agency] = PageValidators(
+            etag=page.etag,
+            last_modified=page.last_modified,
+            content_hash=page.content_hash,
+            newest_id=newest_id
+        )
+
+
+class TelegramFetcher:
+    """
+    Долгоживущий HTTP-клиент для страниц t.me/s/{agency} с общим пулом соединений.
+    Long-lived HTTP client for t.me/s/{agency} pages with a shared connection pool.
+    """
+
+    def __init__(self, base_url: str = TELEGRAM_URL, limiter: Optional[TokenBucket] = None):
+        self.base_url = base_url
+        self.timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+        self.cache = PageCache()
+        self.limiter = limiter or TokenBucket()
+        # Исходы запросов по агентствам с последнего отчёта
+        self.outcomes: Counter[tuple[str, str]] = Counter()
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=FETCH_LIMIT,
+            limit_per_host=FETCH_LIMIT_PER_HOST,
+            use_dns_cache=True,
+            ttl_dns_cache=FETCH_DNS_TTL
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.session:
+            await self.session.close()
+
+    def channel_url(self, agency: str) -> str:
+        return f'{self.base_url}/s/{agency}'
+
+    def _outcome(self, agency: str, result: str):
+        FETCH_PAGES.labels(agency, result).inc()
+        self.outcomes[agency, result] += 1
+
+    @staticmethod
+    def retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+        """Пауза из заголовка Retry-After в секундах: число или HTTP-дата."""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """Экспоненциальная пауза с полным джиттером."""
+        return random.uniform(0, min(FETCH_BACKOFF_MAX, FETCH_BACKOFF_BASE * 2 ** attempt))
+
+    async def _get(self, agency: str, kind: str, **kwargs) -> tuple[int, dict, bytes, str]:
+        """
+        GET страницы канала через общий лимит с повторами при 429, 5xx и сетевых ошибках.
+        GET of a channel page through the shared limit, retried on 429, 5xx and network errors.
+        """
+        for attempt in range(FETCH_RETRIES + 1):
+            await self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                async with self.session.get(self.channel_url(agency), **kwargs) as response:
+                    body = await response.read() if response.status == 200 else b''
+                    FETCH_SECONDS.labels(agency, kind).observe(time.perf_counter() - started)
+                    if response.status in (200, 304):
+                        return response.status, dict(response.headers), body, response.charset or 'utf-8'
+                    if response.status not in RETRY_STATUSES:
+                        self._outcome(agency, 'error')
+                        raise FetchError(agency, response.status, f'ответ {response.status} на {response.url}')
+                    status, delay = response.status, self.retry_after(response)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, delay, error = None, None, e
+            if status == 429:
+                # Лимит Telegram касается всех агентств: пауза на всё ведро
+                delay = delay if delay is not None else self.backoff(attempt)
+                self.limiter.pause(delay)
+                self._outcome(agency, 'throttled')
+            if attempt == FETCH_RETRIES:
+                break
+            delay = min(delay if delay is not None else self.backoff(attempt), FETCH_BACKOFF_MAX)
+            self._outcome(agency, 'retry')
+            logger.debug(f'{agency}: {status or error}, повтор {attempt + 1}/{FETCH_RETRIES} через {delay:.1f} с')
+            await asyncio.sleep(delay)
+
+        self._outcome(agency, 'error')
+        raise FetchError(agency, status, f'не удалось загрузить страницу за {FETCH_RETRIES + 1} попыток: '
+                                         f'{status or error}')
+
+    async def fetch_channel(self, agency: str, last_id: int) -> ChannelPage:
+        """
+        Загружает страницу канала, пропуская её, если она не изменилась с прошлого раза.
+        Downloads the channel page, skipping it if it has not changed since the last time.
+        """
+        headers = self.cache.conditional_headers(agency, last_id)
+        status, response_headers, body, charset = await self._get(agency, 'page', headers=headers)
+        if status == 304:
+            self._outcome(agency, 'not_modified')
+            return ChannelPage(agency=agency, not_modified=True)
+        page = ChannelPage(
+            agency=agency,
+            etag=response_headers.get('ETag'),
+            last_modified=response_headers.get('Last-Modified'),
+            content_hash=hashlib.sha1(body).hexdigest()
+        )
+        if self.cache.is_unchanged(agency, last_id, page.content_hash):
+            self._outcome(agency, 'unchanged')
+            page.not_modified = True
+            return page
+        self._outcome(agency, 'modified')
+        page.html = body.decode(charset, errors='replace')
+        return page
+
+    async def fetch_history(self, agency: str, before: int) -> str:
+        """
+        Загружает страницу истории канала с сообщениями до номера before.
+        Downloads a channel history page with messages older than before.
+        """
+        _, _, body, charset = await self._get(agency, 'history', params={'before': before})
+        return body.decode(charset, errors='replace')
+
+    def report(self):
+        """Логирует агентства с повторами, ограничениями и ошибками загрузки и сбрасывает счётчики."""
+        problems = {}
+        for (agency, result), count in self.outcomes.items():
+            if result in ('retry', 'throttled', 'error'):
+                problems.setdefault(agency, []).append(f'{result} {count}')
+        if problems:
+            logger.warning('Проблемы загрузки страниц: ' + '; '.join(
+                f'{agency}: {", ".join(results)}' for agency, results in sorted(problems.items())
+            ))
+        self.outcomes.clear()
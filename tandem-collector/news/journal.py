@@ -0,0 +1,178 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+from loguru import logger
+
+from models.news_item import NewsItem
+
+# Файл журнала обработки новостей (пустое значение отключает журнал) и число возобновлений,
+# после которого новость, так и не дошедшая до базы, удаляется из журнала
+WORK_QUEUE_PATH = os.getenv("WORK_QUEUE_PATH", "data/work_queue.sqlite")
+WORK_QUEUE_MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", 3))
+
+# Этапы обработки новости по порядку; после persist новость удаляется из журнала
+STAGES = ('fetch', 'clean', 'embed', 'categorize', 'summarize', 'headline', 'persist')
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS work_items (
+        url TEXT PRIMARY KEY,
+        agency TEXT NOT NULL,
+        item TEXT NOT NULL,
+        stages TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS work_items_agency ON work_items (agency);
+"""
+
+
+@dataclass
+class WorkEntry:
+    agency: str
+    stages: set[str] = field(default_factory=set)
+    attempts: int = 0
+    # Запуск, который сейчас обрабатывает новость; None — новость ждёт возобновления
+    owner: object = None
+
+
+class WorkQueue:
+    """
+    Журнал прохождения новостей по этапам конвейера на диске (SQLite).
+    On-disk (SQLite) journal of news progress through the pipeline stages.
+
+    Новость попадает в журнал сразу после разбора и очистки, каждый этап обогащения сохраняет
+    в нём свой результат, а после записи в базу новость удаляется. Если процесс упал, следующий
+    запуск агентства продолжает его новости с последнего завершённого этапа и не берёт в работу
+    их повторно загруженные копии.
+    A news item enters the journal right after parsing and cleaning, every enrichment stage stores
+    its result there, and the item is removed once written to the database. If the process died,
+    the next run of the agency resumes its news from the last completed stage and skips their
+    re-fetched copies.
+    """
+
+    def __init__(self, path: str = WORK_QUEUE_PATH, max_attempts: int = WORK_QUEUE_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._entries = {
+            url: WorkEntry(agency=agency, stages=set(stages.split(',')), attempts=attempts)
+            for url, agency, stages, attempts in self._conn.execute('SELECT url, agency, stages, attempts FROM work_items')
+        }
+        if self._entries:
+            logger.info(f'В журнале обработки {len(self._entries)} незавершённых новостей')
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._entries
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute_many(self, query: str, rows: list[tuple]):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.executemany(query, rows)
+            self._conn.execute('COMMIT')
+
+    async def record(self, items: list[NewsItem], owner: object) -> list[NewsItem]:
+        """
+        Заносит в журнал разобранные и очищенные новости и возвращает те, которых в нём ещё не было.
+        Records parsed and cleaned news and returns those that were not in the journal yet.
+        """
+        new_items = [item for item in items if item.url not in self._entries]
+        if not new_items:
+            return []
+        stages = {'fetch', 'clean'}
+        for item in new_items:
+            self._entries[item.url] = WorkEntry(agency=item.agency, stages=set(stages), owner=owner)
+        now = time.time()
+        await asyncio.to_thread(self._execute_many, """
+            INSERT OR REPLACE INTO work_items (url, agency, item, stages, attempts, updated_at)
+            VALUES (?, ?, ?, ?, 0, ?)
+        """, [(item.url, item.agency, item.model_dump_json(), ','.join(sorted(stages)), now) for item in new_items])
+        return new_items
+
+    def missing(self, items: list[NewsItem], stage: str) -> list[NewsItem]:
+        """Новости, которые ещё не прошли этап stage."""
+        return [item for item in items if item.url not in self._entries or stage not in self._entries[item.url].stages]
+
+    async def complete(self, items: list[NewsItem], *stages: str):
+        """Отмечает этапы пройденными и сохраняет их результаты вместе с новостью."""
+        rows = []
+        now = time.time()
+        for item in items:
+            entry = self._entries.get(item.url)
+            if entry is None:
+                continue
+            entry.stages.update(stages)
+            rows.append((item.model_dump_json(), ','.join(sorted(entry.stages)), now, item.url))
+        if rows:
+            await asyncio.to_thread(self._execute_many,
+                                    'UPDATE work_items SET item = ?, stages = ?, updated_at = ? WHERE url = ?', rows)
+
+    async def remove(self, items: list[NewsItem]):
+        """Удаляет записанные в базу новости из журнала."""
+        urls = [item.url for item in items if self._entries.pop(item.url, None) is not None]
+        if urls:
+            await asyncio.to_thread(self._execute_many, 'DELETE FROM work_items WHERE url = ?', [(url,) for url in urls])
+
+    def _load(self, urls: list[str]) -> list[NewsItem]:
+        with self._lock:
+            placeholders = ', '.join('?' * len(urls))
+            rows = self._conn.execute(f'SELECT item FROM work_items WHERE url IN ({placeholders})', urls).fetchall()
+        return [NewsItem.model_validate_json(item) for item, in rows]
+
+    async def resume(self, agencies: Iterable[str], owner: object) -> dict[str, list[NewsItem]]:
+        """
+        Забирает в работу незавершённые новости агентств, оставшиеся от упавших или неудачных запусков.
+        Claims unfinished news of the agencies left over from crashed or failed runs.
+        """
+        agencies = set(agencies)
+        claimed, exhausted = [], []
+        for url, entry in self._entries.items():
+            if entry.owner is not None or entry.agency not in agencies:
+                continue
+            if entry.attempts >= self.max_attempts:
+                exhausted.append(url)
+                continue
+            entry.owner = owner
+            entry.attempts += 1
+            claimed.append(url)
+
+        if exhausted:
+            logger.warning(f'Из журнала обработки удалено {len(exhausted)} новостей после '
+                           f'{self.max_attempts} неудачных возобновлений: {", ".join(exhausted[:5])}')
+            for url in exhausted:
+                del self._entries[url]
+            await asyncio.to_thread(self._execute_many, 'DELETE FROM work_items WHERE url = ?',
+                                    [(url,) for url in exhausted])
+        if not claimed:
+            return {}
+
+        await asyncio.to_thread(self._execute_many, 'UPDATE work_items SET attempts = attempts + 1 WHERE url = ?',
+                                [(url,) for url in claimed])
+        resumed: dict[str, list[NewsItem]] = {}
+        for item in sorted(await asyncio.to_thread(self._load, claimed), key=lambda item: item.date):
+            resumed.setdefault(item.agency, []).append(item)
+        logger.info(f'Возобновлена обработка {len(claimed)} новостей из журнала')
+        return resumed
+
+    def release(self, owner: object):
+        """Возвращает незавершённые новости запуска в ожидание возобновления."""
+        for entry in self._entries.values():
+            if entry.owner is owner:
+                entry.owner = None
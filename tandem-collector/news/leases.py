@@ -0,0 +1,177 @@
+import asyncio
+import os
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import Iterable
+from loguru import logger
+
+from db.database import DatabaseManager
+
+# Срок аренды агентств экземпляром сборщика, секунды (0 — один экземпляр обрабатывает все агентства);
+# аренда продлевается каждую треть срока, а агентства упавшего экземпляра забираются после её истечения
+AGENCY_LEASE_SECONDS = float(os.getenv("AGENCY_LEASE_SECONDS", 0))
+# Имя экземпляра сборщика, уникальное среди работающих с одной базой
+COLLECTOR_INSTANCE = os.getenv("COLLECTOR_INSTANCE", f'{socket.gethostname()}-{os.getpid()}')
+
+LEASES_DDL = """
+    CREATE TABLE IF NOT EXISTS collector_instances (
+        instance text PRIMARY KEY,
+        heartbeat_at timestamp NOT NULL DEFAULT now()
+    );
+    CREATE TABLE IF NOT EXISTS agency_leases (
+        agency text PRIMARY KEY,
+        owner text NOT NULL,
+        expires_at timestamp NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS agency_leases_owner ON agency_leases (owner);
+"""
+
+
+class AgencyLeases:
+    """
+    Распределение агентств между экземплярами сборщика через таблицу аренд в основной базе.
+    Partitioning of agencies between collector instances through a lease table in the main database.
+
+    Каждый экземпляр отмечается в collector_instances и держит аренду не больше своей доли
+    агентств (доли живых экземпляров различаются не больше чем на одно агентство). Лишние агентства возвращаются, когда их
+    не обрабатывают, свободные и просроченные аренды забираются при каждом продлении, поэтому
+    агентства упавшего экземпляра переходят к остальным через AGENCY_LEASE_SECONDS. Аренда
+    переходит к другому экземпляру только после истечения. Если экземпляр не смог продлить аренду
+    и она истекла посреди запуска, проверка аренды в каждой транзакции записи (LEASE_FENCE, FOR SHARE)
+    откатывает запись новостей и водяного знака агентства, которое уже может обрабатывать новый владелец:
+    в худшем случае оба экземпляра повторно вызывают модели, а запись остаётся за владельцем аренды.
+    Every instance registers in collector_instances and holds leases on at most its share of
+    agencies (the shares of live instances differ by at most one agency). Surplus agencies are handed back while they are
+    not being processed, free and expired leases are claimed on every renewal, so the agencies
+    of a dead instance move to the others after AGENCY_LEASE_SECONDS. A lease passes to another
+    instance only after it expires. If an instance failed to renew and its lease expired mid-run,
+    the lease check inside every write transaction (LEASE_FENCE, FOR SHARE) rolls back the news and
+    watermark writes of an agency the new owner may already be processing: at worst both instances
+    run the models, and only the lease holder writes.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, instance: str = COLLECTOR_INSTANCE,
+                 lease_seconds: float = AGENCY_LEASE_SECONDS):
+        self.db_manager = db_manager
+        self.instance = instance
+        self.lease_seconds = lease_seconds
+        self.owned: set[str] = set()
+        self.busy: set[str] = set()
+        # Локальный срок аренд: если продлить их не удалось, экземпляр перестаёт брать агентства в работу
+        self._valid_until = 0.0
+        self._ready = False
+
+    @property
+    def active(self) -> set[str]:
+        """Агентства, аренда которых заведомо не истекла."""
+        return self.owned if time.monotonic() < self._valid_until else set()
+
+    async def renew(self) -> set[str]:
+        """
+        Отмечает экземпляр живым, продлевает аренды, возвращает лишние и забирает свободные агентства.
+        Marks the instance alive, extends its leases, hands back surplus and claims free agencies.
+        """
+        started = time.monotonic()
+        async with self.db_manager.main_pool.acquire() as conn:
+            if not self._ready:
+                await conn.execute(LEASES_DDL)
+                self._ready = True
+            await conn.execute("""
+                INSERT INTO collector_instances (instance, heartbeat_at) VALUES ($1, now())
+                ON CONFLICT (instance) DO UPDATE SET heartbeat_at = now()
+            """, self.instance)
+            # Строки аренд заводятся заранее для всех агентств, чтобы захват шёл через SKIP LOCKED без взаимоблокировок
+            await conn.execute("""
+                INSERT INTO agency_leases (agency, owner, expires_at)
+                SELECT telegram, '', '-infinity' FROM agencies WHERE is_parsing is True ORDER BY telegram
+                ON CONFLICT (agency) DO NOTHING
+            """)
+            async with conn.transaction():
+                instances = [row['instance'] for row in await conn.fetch("""
+                    SELECT instance FROM collector_instances
+                    WHERE heartbeat_at >= now() - make_interval(secs => $1)
+                    ORDER BY instance
+                """, self.lease_seconds)]
+                agencies = await conn.fetchval('SELECT count(*) FROM agencies WHERE is_parsing is True')
+                # Доли отличаются не больше чем на одно агентство и в сумме дают все агентства
+                rank = instances.index(self.instance) if self.instance in instances else len(instances) - 1
+                share = agencies // len(instances) + (rank < agencies % len(instances))
+
+                owned = {row['agency'] for row in await conn.fetch("""
+                    UPDATE agency_leases SET expires_at = now() + make_interval(secs => $2)
+                    WHERE owner = $1 AND expires_at >= now() RETURNING agency
+                """, self.instance, self.lease_seconds)}
+
+                surplus = sorted(owned - self.busy)[:max(len(owned) - share, 0)]
+                if surplus:
+                    await conn.execute("""
+                        UPDATE agency_leases SET owner = '', expires_at = '-infinity'
+                        WHERE owner = $1 AND agency = ANY($2)
+                    """, self.instance, surplus)
+                    owned.difference_update(surplus)
+
+                claimed = set()
+                if len(owned) < share:
+                    # Порядок кандидатов свой у каждого экземпляра: одновременные захваты редко сталкиваются
+                    claimed = {row['agency'] for row in await conn.fetch("""
+                        UPDATE agency_leases SET owner = $1, expires_at = now() + make_interval(secs => $2)
+                        WHERE agency IN (
+                            SELECT l.agency FROM agency_leases l
+                            JOIN agencies a ON a.telegram = l.agency AND a.is_parsing is True
+                            WHERE l.expires_at < now()
+                            ORDER BY md5(l.agency || $1)
+                            LIMIT $3
+                            FOR UPDATE OF l SKIP LOCKED
+                        )
+                        RETURNING agency
+                    """, self.instance, self.lease_seconds, share - len(owned))}
+                    owned |= claimed
+
+        self.owned = owned
+        self._valid_until = started + self.lease_seconds
+        if surplus or claimed:
+            logger.info(f'Аренда агентств {self.instance}: {len(owned)} из доли {share} '
+                        f'({len(instances)} экземпляров), взято {len(claimed)}, отдано {len(surplus)}')
+        return owned
+
+    @asynccontextmanager
+    async def hold(self, agencies: Iterable[str]):
+        """
+        Оставляет из agencies арендованные экземпляром агентства и не отдаёт их, пока они в работе.
+        Keeps the agencies leased by the instance and does not hand them back while they are processed.
+        """
+        held = set(agencies) & self.active
+        self.busy |= held
+        try:
+            yield held
+        finally:
+            self.busy -= held
+
+    async def release(self):
+        """Возвращает все аренды экземпляра при остановке."""
+        async with self.db_manager.main_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    UPDATE agency_leases SET owner = '', expires_at = '-infinity' WHERE owner = $1
+                """, self.instance)
+                await conn.execute('DELETE FROM collector_instances WHERE instance = $1', self.instance)
+        self.owned = set()
+
+    async def serve(self):
+        """
+        Продлевает аренды каждую треть срока до отмены, затем возвращает их.
+        Renews the leases every third of the term until cancelled, then hands them back.
+        """
+        try:
+            while True:
+                try:
+                    await self.renew()
+                except Exception as e:
+                    logger.exception(f'Не удалось продлить аренду агентств {self.instance}: {e}')
+                await asyncio.sleep(self.lease_seconds / 3)
+        finally:
+            try:
+                await self.release()
+            except Exception as e:
+                logger.warning(f'Не удалось вернуть аренду агентств {self.instance}: {e}')
@@ -1,37 +1,40 @@
-import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
+import os
 from datetime import datetime
+from loguru import logger
+from math import ceil
 from typing import Optional
 import pytz
 
 from models.news_item import NewsItem
 from api.client import NewsAPIClient
+from news.extractors import HtmlExtractor, RawMessage, get_extractor, message_id
+from news.fetcher import ChannelPage, TelegramFetcher
+from monitoring.metrics import EXTRACT_SECONDS
+
+# Число сообщений на одной странице t.me/s/{agency}
+CHANNEL_PAGE_SIZE = 20
+# Сколько страниц истории догружать одновременно и максимум за один запуск
+CATCHUP_CONCURRENCY = int(os.getenv("CATCHUP_CONCURRENCY", 4))
+CATCHUP_MAX_PAGES = int(os.getenv("CATCHUP_MAX_PAGES", 50))
 
 
 class NewsParser:
-    def __init__(self, api_client: NewsAPIClient):
+    def __init__(self, api_client: NewsAPIClient, fetcher: TelegramFetcher,
+                 extractor: Optional[HtmlExtractor] = None):
         self.api_client = api_client
+        self.fetcher = fetcher
+        self.extractor = extractor or get_extractor()
 
     @staticmethod
-    async def fetch(session: aiohttp.ClientSession, url: str) -> str:
-        """
-        Получает HTML-контент по указанному URL.
-        Fetches HTML content from the specified URL.
+    def extract_link(href: Optional[str], url: str) -> str:
         """
-        async with session.get(url) as response:
-            return await response.text()
-
-    @staticmethod
-    def extract_link(tag_a: Optional[BeautifulSoup], url: str) -> str:
-        """
-        Извлекает ссылку из HTML-тега или возвращает исходный URL.
-        Extracts link from HTML tag or returns the original URL.
+        Очищает ссылку из текста новости или возвращает исходный URL.
+        Cleans the link from the news text or returns the original URL.
         """
         # pattern = r"^https://t\.me/[\w\d_]+/\d+$"
-        if not tag_a:
+        if not href:
             return url
-        href = tag_a.get('href')
         if href.startswith(('tg://resolve?domain=', 'https://t.me')):
             return url
         links = href.split('?utm')[0]
@@ -51,27 +54,23 @@ class NewsParser:
                 db_date = date_moscow.replace(tzinfo=None)
         return db_date
 
-    async def process_news_content(self, news_content: BeautifulSoup, agency: str) -> Optional[NewsItem]:
+    def process_news_content(self, message: RawMessage, agency: str) -> Optional[NewsItem]:
         """
-        Обрабатывает содержимое новости и создает объект NewsItem.
-        Processes news content and creates a NewsItem object.
+        Обрабатывает содержимое новости и создает объект NewsItem с неочищенным текстом.
+        Processes news content and creates a NewsItem object with the raw text.
         """
-        dirty_news = news_content.find(attrs={'class': 'tgme_widget_message_text js-message_text'})
-        if not dirty_news:
+        if message.text is None or message.datetime is None:
             return None
 
-        url = news_content.find(attrs={'class': 'tgme_widget_message_date'}).get('href')
-        page_date = datetime.fromisoformat(news_content.find(attrs={'class': 'time'}).get('datetime'))
+        url = message.url
+        page_date = datetime.fromisoformat(message.datetime)
         date = NewsParser.transform_timezone(page_date, mode='msk')
-        tag_a = dirty_news.find('a')
-        links = [self.extract_link(tag_a, url)]
+        links = [self.extract_link(message.href, url)]
 
-        news = dirty_news.text
+        news = message.text
         if agency == 'briefsmi':
             news = news.split(': ')[-1].split('#')[0]
 
-        news = await self.api_client.clean_text(news, agency)
-
         return NewsItem(
             url=url,
             date=date,
@@ -80,21 +79,115 @@ class NewsParser:
             agency=agency
         )
 
+    @staticmethod
+    def message_id(url: str) -> int:
+        """Номер сообщения в канале из его URL."""
+        return message_id(url)
+
+    async def fetch_agency(self, agency: str, last_id: int) -> ChannelPage:
+        """
+        Загружает страницу канала агентства.
+        Downloads the agency channel page.
+        """
+        return await self.fetcher.fetch_channel(agency, last_id)
+
+    def page_messages(self, html: str) -> dict[int, RawMessage]:
+        """
+        Возвращает сообщения страницы канала по их номерам.
+        Returns the messages of a channel page keyed by message id.
+        """
+        with EXTRACT_SECONDS.labels(self.extractor.name).time():
+            return self.extractor.extract(html)
+
+    async def catch_up(self, agency: str, last_id: int, oldest_id: int) -> dict[int, RawMessage]:
+        """
+        Догружает историю канала по курсору ?before= до last_id.
+        Loads the channel history through the ?before= cursor down to last_id.
+
+        Страницы запрашиваются волнами по CATCHUP_CONCURRENCY с предполагаемыми курсорами через шаг.
+        Страница бывает короче CHANNEL_PAGE_SIZE номеров (удалённые и служебные сообщения, альбомы),
+        поэтому история считается загруженной только до первого разрыва между страницами волны:
+        следующая волна начинается с самого старого сообщения непрерывной части, а шаг уменьшается
+        до самой короткой из увиденных страниц.
+        Pages are requested in waves of CATCHUP_CONCURRENCY with cursors guessed one step apart.
+        A page may span fewer than CHANNEL_PAGE_SIZE ids (deleted and service messages, albums),
+        so the history only counts as loaded up to the first gap between the pages of a wave:
+        the next wave starts from the oldest message of the contiguous part, and the step shrinks
+        to the shortest page seen.
+        """
+        messages = {}
+        cursor = oldest_id
+        step = CHANNEL_PAGE_SIZE
+        pages_left = CATCHUP_MAX_PAGES
+        gaps = 0
+        while cursor > last_id + 1 and pages_left > 0:
+            wave = min(CATCHUP_CONCURRENCY, pages_left, ceil((cursor - last_id - 1) / step))
+            cursors = [cursor - k * step for k in range(wave)]
+            pages = await asyncio.gather(*(self.fetcher.fetch_history(agency, before) for before in cursors))
+            pages_left -= wave
+
+            # Самое старое сообщение, до которого история загружена без пропусков
+            reached, contiguous, exhausted = cursor, True, False
+            for before, html in zip(cursors, pages):
+                page = {number: message for number, message in self.page_messages(html).items() if number < before}
+                messages.update(page)
+                if not contiguous:
+                    continue
+                if before < reached:
+                    # Между предыдущей страницей и этой есть номера, которых не было ни на одной странице
+                    contiguous = False
+                    gaps += 1
+                    continue
+                if not page:
+                    # Старше курсора сообщений нет: достигнуто начало канала
+                    exhausted = True
+                    break
+                reached = min(page)
+                step = min(step, max(before - reached, 1))
+
+            if reached >= cursor:
+                break
+            cursor = reached
+            if exhausted:
+                break
+
+        if cursor > last_id + 1 and pages_left <= 0:
+            logger.warning(f'{agency}: достигнут лимит догрузки в {CATCHUP_MAX_PAGES} страниц, '
+                           f'новости {last_id + 1}-{cursor - 1} пропущены')
+        elif messages:
+            logger.info(f'{agency}: догружено {len(messages)} сообщений за {CATCHUP_MAX_PAGES - pages_left} страниц'
+                        + (f', разрывов между страницами {gaps}' if gaps else ''))
+        return messages
+
+    async def parse_agency_page(self, page: ChannelPage, last_id: int) -> list[NewsItem]:
+        """
+        Извлекает из страницы канала новости, вышедшие после last_id.
+        Если страница не дотягивается до last_id, недостающая история догружается.
+        Extracts news published after last_id from the channel page.
+        If the page does not reach last_id, the missing history is loaded as well.
+        """
+        if page.not_modified:
+            return []
+        messages = self.page_messages(page.html)
+        if messages and last_id and min(messages) > last_id + 1:
+            messages.update(await self.catch_up(page.agency, last_id, min(messages)))
+
+        last_messages = [messages[number] for number in sorted(messages) if number > last_id]
+        items = [item for item in (self.process_news_content(message, page.agency)
+                                   for message in last_messages) if item]
+
+        # Все тексты агентства очищаются одним запросом
+        clean_texts = await self.api_client.clean_texts([item.news for item in items], page.agency)
+        for item, news in zip(items, clean_texts):
+            item.news = news
+
+        self.fetcher.cache.remember(page, newest_id=max([last_id, *(self.message_id(item.url) for item in items)]))
+        return items
+
     async def parse_agency(self, agency: str, last_id: int) -> list[NewsItem]:
         """
         Парсит новости для конкретного агентства.
         Parses news for a specific agency.
         """
-        agency_url = f'https://t.me/s/{agency}'
-        async with aiohttp.ClientSession() as session:
-            html = await self.fetch(session, agency_url)
-            soup = BeautifulSoup(html, 'lxml')
-            try:
-                news_pages = soup.body.main.section.find_all(attrs={'class': 'tgme_widget_message_bubble'})
-                last_news_pages = [page for page in news_pages if int(
-                    page.find(attrs={'class': 'tgme_widget_message_date'}).get('href').split('/')[-1]) > last_id]
-
-                tasks = [self.process_news_content(news_content, agency) for news_content in last_news_pages]
-                return [item for item in await asyncio.gather(*tasks) if item]
-            except AttributeError:
-                return []
+        page = await self.fetch_agency(agency, last_id)
+        return await self.parse_agency_page(page, last_id)
@@ -0,0 +1,233 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable, Optional, Union
+
+from loguru import logger
+
+from models.news_item import NewsItem
+from news.fetcher import ChannelPage
+from monitoring.metrics import (
+    INFLIGHT_ITEMS, QUEUE_DEPTH, STAGE_BLOCKED_SECONDS, STAGE_FAILURES, STAGE_ITEMS, STAGE_SECONDS
+)
+
+
+@dataclass
+class AgencyBatch:
+    """
+    Единица работы конвейера: одно агентство и его новости на текущем этапе.
+    Pipeline work unit: one agency and its news at the current stage.
+    """
+    agency: str
+    last_id: int
+    position: str = ""
+    page: Optional[ChannelPage] = None
+    items: list[NewsItem] = field(default_factory=list)
+    # Незавершённые новости агентства из журнала, продолжающие обработку с этапа parse
+    resumed: list[NewsItem] = field(default_factory=list)
+    # Сколько новостей пакета учтено в бюджете конвейера
+    reserved: int = 0
+
+    def split(self, size: int) -> list['AgencyBatch']:
+        """Делит пакет на микропакеты не больше size новостей."""
+        if size <= 0 or len(self.items) <= size:
+            return [self]
+        return [
+            AgencyBatch(agency=self.agency, last_id=self.last_id, position=self.position,
+                        items=self.items[start:start + size])
+            for start in range(0, len(self.items), size)
+        ]
+
+
+class ItemBudget:
+    """
+    Ограничение числа новостей, которые уже разобраны, но ещё не записаны в базу.
+    Cap on the number of news that are already parsed but not yet written to the DB.
+
+    Пакет больше лимита пропускается, только когда в работе нет других новостей.
+    A batch larger than the limit is only let through when nothing else is in flight.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, count: int):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight == 0 or self.in_flight + count <= self.limit)
+            self.in_flight += count
+            self.peak = max(self.peak, self.in_flight)
+            INFLIGHT_ITEMS.inc(count)
+
+    async def release(self, count: int):
+        async with self._condition:
+            self.in_flight -= count
+            INFLIGHT_ITEMS.dec(count)
+            self._condition.notify_all()
+
+
+@dataclass
+class Stage:
+    """
+    Описание этапа конвейера: обработчик, число воркеров и размер входной очереди.
+    Pipeline stage description: handler, worker count and input queue size.
+
+    Обработчик возвращает пакет (или список микропакетов) для следующего этапа или None,
+    если пакет дальше не идёт. Новости пакетов, выходящих из этапа с reserve=True,
+    учитываются в бюджете конвейера до конца последнего этапа. count задаёт, сколько единиц
+    работы (по умолчанию новостей) несёт результат этапа, unit — их название в отчёте.
+    The handler returns a batch (or a list of micro-batches) for the next stage or None
+    if the batch goes no further. News of batches leaving a stage with reserve=True
+    count against the pipeline budget until the last stage is done with them. count gives
+    the units of work (news by default) in a stage result, unit names them in the report.
+    """
+    name: str
+    handler: Callable[[AgencyBatch], Awaitable[Union[AgencyBatch, list[AgencyBatch], None]]]
+    workers: int = 1
+    queue_size: int = 0
+    reserve: bool = False
+    count: Callable[[AgencyBatch], int] = lambda batch: len(batch.items)
+    unit: str = 'новостей'
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    unit: str = 'новостей'
+    batches: int = 0
+    items: int = 0
+    failed: int = 0
+    # Время работы обработчика и время ожидания бюджета или места в очереди следующего этапа
+    busy_seconds: float = 0.0
+    blocked_seconds: float = 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        """Пропускная способность этапа по времени его работы."""
+        return self.items / self.busy_seconds if self.busy_seconds else 0.0
+
+    def utilization(self, wall_seconds: float) -> float:
+        """Доля времени, в течение которого воркеры этапа были заняты."""
+        capacity = wall_seconds * self.workers
+        return self.busy_seconds / capacity if capacity else 0.0
+
+
+class Pipeline:
+    """
+    Асинхронный конвейер из этапов, связанных ограниченными очередями.
+    Asynchronous pipeline of stages connected by bounded queues.
+
+    Пока один пакет находится на этапе обогащения, следующие уже скачиваются и разбираются.
+    While one batch is being enriched, the next ones are already being fetched and parsed.
+    """
+
+    def __init__(self, stages: list[Stage], budget: Optional[ItemBudget] = None):
+        self.stages = stages
+        self.budget = budget
+        self.stats = {stage.name: StageStats(stage.name, stage.workers, stage.unit) for stage in stages}
+        self.wall_seconds = 0.0
+
+    async def _release(self, batch: AgencyBatch):
+        if self.budget and batch.reserved:
+            await self.budget.release(batch.reserved)
+            batch.reserved = 0
+
+    async def _worker(self, stage: Stage, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue],
+                      next_stage: Optional[str]):
+        stats = self.stats[stage.name]
+        while True:
+            batch = await inbox.get()
+            QUEUE_DEPTH.labels(stage.name).dec()
+            started = time.perf_counter()
+            handled = None
+            try:
+                result = await stage.handler(batch)
+                # Время этапа — только работа обработчика, без ожидания обратного давления
+                handled = time.perf_counter()
+                self._observe(stats, handled - started)
+                stats.batches += 1
+                results = result if isinstance(result, list) else [result] if result is not None else []
+                if all(item is not batch for item in results):
+                    await self._release(batch)
+                for item in results:
+                    count = stage.count(item)
+                    stats.items += count
+                    STAGE_ITEMS.labels(stage.name, item.agency).inc(count)
+                    if outbox is None:
+                        await self._release(item)
+                        continue
+                    if stage.reserve and self.budget:
+                        await self.budget.acquire(len(item.items))
+                        item.reserved = len(item.items)
+                    await outbox.put(item)
+                    QUEUE_DEPTH.labels(next_stage).inc()
+            except Exception as e:
+                if handled is None:
+                    self._observe(stats, time.perf_counter() - started)
+                stats.failed += 1
+                STAGE_FAILURES.labels(stage.name, batch.agency).inc()
+                await self._release(batch)
+                logger.exception(f'Ошибка на этапе {stage.name} для {batch.agency}: {e}')
+            finally:
+                if handled is not None:
+                    blocked = time.perf_counter() - handled
+                    stats.blocked_seconds += blocked
+                    STAGE_BLOCKED_SECONDS.labels(stage.name).inc(blocked)
+                inbox.task_done()
+
+    @staticmethod
+    def _observe(stats: StageStats, elapsed: float):
+        stats.busy_seconds += elapsed
+        STAGE_SECONDS.labels(stats.name).observe(elapsed)
+
+    async def run(self, batches: Iterable[Any]):
+        """
+        Прогоняет пакеты через все этапы и дожидается полной обработки.
+        Runs the batches through all stages and waits until everything is processed.
+        """
+        started = time.perf_counter()
+        queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        workers = []
+        for i, stage in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            next_stage = self.stages[i + 1].name if outbox is not None else None
+            workers.append([
+                asyncio.create_task(self._worker(stage, queues[i], outbox, next_stage))
+                for _ in range(max(stage.workers, 1))
+            ])
+
+        try:
+            for batch in batches:
+                await queues[0].put(batch)
+                QUEUE_DEPTH.labels(self.stages[0].name).inc()
+
+            # Этапы закрываются по очереди: когда опустела очередь этапа,
+            # все его результаты уже переданы следующему
+            for queue, stage_workers in zip(queues, workers):
+                await queue.join()
+                for task in stage_workers:
+                    task.cancel()
+                await asyncio.gather(*stage_workers, return_exceptions=True)
+        finally:
+            for task in (task for stage_workers in workers for task in stage_workers):
+                task.cancel()
+            self.wall_seconds = time.perf_counter() - started
+
+    def report(self):
+        """
+        Выводит в лог пропускную способность каждого этапа.
+        Logs the throughput of every stage.
+        """
+        logger.info(f'Конвейер отработал за {self.wall_seconds:.1f} секунд')
+        if self.budget:
+            logger.info(f'Новостей в работе одновременно: максимум {self.budget.peak} при лимите {self.budget.limit}')
+        for stats in self.stats.values():
+            logger.info(
+                f'Этап {stats.name}: пакетов {stats.batches}, {stats.unit} {stats.items}, ошибок {stats.failed}, '
+                f'занят {stats.busy_seconds:.1f} с, {stats.items_per_second:.2f} {stats.unit}/с, '
+                f'загрузка воркеров ({stats.workers}) {stats.utilization(self.wall_seconds):.0%}, '
+                f'ожидание следующего этапа {stats.blocked_seconds:.1f} с'
+            )
@@ -1,8 +1,20 @@
 import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
 from loguru import logger
 
 from models.news_item import NewsItem, OldNewsItem
+from news.cache import EnrichmentCache
+from news.dedup import MODELS_PER_ITEM, NearDuplicateIndex
+from news.journal import WorkQueue
+from news.leases import AgencyLeases
 from news.parser import NewsParser
+from news.pipeline import AgencyBatch, ItemBudget, Pipeline, Stage
+from db.database import DatabaseManager, InsertResult, LeaseLost
+from api.registry import registry
+from monitoring.metrics import MODEL_ITEMS, MODEL_SECONDS
 import fasttext
 import warnings
 
@@ -11,78 +23,280 @@ warnings.filterwarnings("ignore")
 # from api.client import NewsAPIClient
 # import pickle
 
+# Число одновременных воркеров на этапах конвейера и размер очередей между ними
+PIPELINE_FETCH_WORKERS = int(os.getenv("PIPELINE_FETCH_WORKERS", 8))
+PIPELINE_PARSE_WORKERS = int(os.getenv("PIPELINE_PARSE_WORKERS", 4))
+PIPELINE_ENRICH_WORKERS = int(os.getenv("PIPELINE_ENRICH_WORKERS", 1))
+PIPELINE_PERSIST_WORKERS = int(os.getenv("PIPELINE_PERSIST_WORKERS", 2))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 4))
+# Размер микропакета и максимум новостей, разобранных, но ещё не записанных в базу
+PIPELINE_MICRO_BATCH = int(os.getenv("PIPELINE_MICRO_BATCH", 64))
+PIPELINE_MAX_INFLIGHT_ITEMS = int(os.getenv("PIPELINE_MAX_INFLIGHT_ITEMS", 256))
+
+# Этапы журнала, которые выполняют модели обогащения
+ENRICHMENT_STAGES = ('embed', 'categorize', 'summarize', 'headline')
+
+
+def get_old_category_model():
+    return fasttext.load_model("models/cat_model.ftz")
+
+
+registry.register('old_category', get_old_category_model)
+
+
+def message_id(item: NewsItem) -> Optional[int]:
+    """Номер сообщения Telegram из ссылки на новость."""
+    tail = item.url.rsplit('/', 1)[-1]
+    return int(tail) if tail.isdigit() else None
+
+
+class WatermarkTracker:
+    """
+    Водяные знаки агентств в пределах одного запуска конвейера.
+    Agency watermarks within one pipeline run.
+
+    Агентство записывается несколькими микропакетами, и более новый микропакет может дойти до базы
+    раньше старого или вместо него, если тот упал на обогащении. Поэтому водяной знак поднимается
+    только до сообщения, перед которым записаны все микропакеты агентства: упавшие новости
+    загружаются заново следующим запуском.
+    An agency is written in several micro-batches, and a newer micro-batch may reach the database
+    before an older one, or instead of it if the older one failed during enrichment. The watermark is
+    therefore only raised up to the message before which every micro-batch of the agency is written:
+    failed news are fetched again by the next run.
+    """
+
+    def __init__(self):
+        # Незаписанные микропакеты агентства: id пакета -> наименьший номер сообщения в нём
+        self.pending: dict[str, dict[int, int]] = {}
+        # Записанные номера сообщений агентства и их даты
+        self.stored: dict[str, list[tuple[int, datetime]]] = {}
+
+    def add(self, batches: list[AgencyBatch]):
+        for batch in batches:
+            ids = [value for value in map(message_id, batch.items) if value is not None]
+            if ids:
+                self.pending.setdefault(batch.agency, {})[id(batch)] = min(ids)
+
+    def persisted(self, batch: AgencyBatch, items: list[NewsItem]) -> Optional[tuple[int, datetime]]:
+        """
+        Отмечает микропакет записанным и возвращает новый водяной знак агентства (номер и дату) или None.
+        Marks the micro-batch as written and returns the new agency watermark (id and date) or None.
+        """
+        pending = self.pending.get(batch.agency, {})
+        pending.pop(id(batch), None)
+        stored = self.stored.setdefault(batch.agency, [])
+        stored.extend((message_id(item), item.date) for item in items if message_id(item) is not None)
+        # Водяной знак не проходит мимо новостей, которые ещё обрабатываются или не дошли до базы
+        limit = min(pending.values()) - 1 if pending else None
+        candidates = [entry for entry in stored if limit is None or entry[0] <= limit]
+        return max(candidates, default=None)
+
 
 class NewsProcessor:
-    def __init__(self, parser: NewsParser):
+    def __init__(self, parser: NewsParser, db_manager: DatabaseManager, dedup: Optional[NearDuplicateIndex] = None,
+                 cache: Optional[EnrichmentCache] = None, journal: Optional[WorkQueue] = None,
+                 leases: Optional[AgencyLeases] = None):
         self.parser = parser
-        self.cat_model = fasttext.load_model("models/cat_model.ftz")
+        self.db_manager = db_manager
+        self.dedup = dedup
+        self.cache = cache
+        self.journal = journal
+        self.leases = leases
+        self.cat_model = registry.get('old_category')
+        # Новости, получившие обогащение от своих почти-дубликатов
+        self.reused = 0
+        self.pipeline: Optional[Pipeline] = None
 
 
     def get_old_category(self, news_list: list[str]) -> list[str]:
         return list(map(lambda x: x[0].split('__label__')[-1], self.cat_model.predict(news_list)[0]))
 
-    async def process_agencies(self, agencies: dict[str, int]) -> tuple[
-        dict[str, list[NewsItem]], dict[str, list[OldNewsItem]]]:
+    async def process_agencies(self, agencies: dict[str, int]) -> tuple[InsertResult, InsertResult]:
         """
-        Обрабатывает новости для всех агентств в обоих форматах.
-        Processes news for all agencies in both formats.
+        Обрабатывает новости для всех агентств в обоих форматах и записывает их в базы данных.
+        Processes news for all agencies in both formats and writes them to the databases.
+
+        Агентства проходят через конвейер fetch -> parse -> enrich -> persist микропакетами,
+        каждый из которых записывается сразу после обогащения: память не растёт к концу запуска,
+        а уже обработанные новости не теряются при сбое на последних агентствах.
+        Agencies flow through the fetch -> parse -> enrich -> persist pipeline in micro-batches,
+        each written right after enrichment: memory stays flat during the run,
+        and finished news survive a failure on the last agencies.
         """
-        all_news = {}
-        all_old_news = {}
+        totals = {'main': InsertResult(), 'old': InsertResult()}
+        watermarks = WatermarkTracker()
+        # Незавершённые новости агентств из журнала продолжают обработку с последнего пройденного этапа
+        resumed = await self.journal.resume(agencies, owner=self) if self.journal is not None else {}
 
-        for i, (agency, last_id) in enumerate(agencies.items()):
-            progress = f'[{(i + 1)}/{len(agencies)}]'
-            logger.info(f'Начинается обработка {progress} {agency} ...')
+        async def fetch(batch: AgencyBatch) -> AgencyBatch:
+            logger.info(f'Начинается обработка {batch.position} {batch.agency} ...')
+            batch.page = await self.parser.fetch_agency(batch.agency, batch.last_id)
+            return batch
 
-            news_items = await self.parser.parse_agency(agency, last_id)
-            if not news_items:
-                logger.info(f'... новых новостей нет')
-                continue
+        async def parse(batch: AgencyBatch) -> Optional[list[AgencyBatch]]:
+            if batch.page.not_modified and not batch.resumed:
+                logger.info(f'... {batch.agency}: страница не изменилась')
+                return None
+            items = []
+            if not batch.page.not_modified:
+                items = await self.parser.parse_agency_page(batch.page, batch.last_id)
+                if self.journal is not None:
+                    # Повторно загруженные копии возобновлённых новостей в работу не берутся
+                    items = await self.journal.record(items, owner=self)
+            batch.items = batch.resumed + items
+            batch.page = None
+            batch.resumed = []
+            if not batch.items:
+                logger.info(f'... {batch.agency}: новых новостей нет')
+                return None
+            batches = batch.split(PIPELINE_MICRO_BATCH)
+            watermarks.add(batches)
+            return batches
 
-            # Обработка новостей для обоих форматов
-            enriched_items = await self.enrich_news_items(news_items)
-            all_news[agency] = enriched_items
+        async def enrich(batch: AgencyBatch) -> AgencyBatch:
+            batch.items = await self.enrich_news_items(batch.items)
+            return batch
 
+        async def persist(batch: AgencyBatch) -> Optional[AgencyBatch]:
+            owner = self.leases.instance if self.leases is not None else None
+            if owner is not None and batch.agency not in self.leases.active:
+                # Аренда истекла во время запуска: агентство мог забрать другой экземпляр
+                logger.warning(f'... {batch.agency}: аренда истекла, {len(batch.items)} новостей не записаны')
+                return None
             # Создание и обогащение старого формата новостей
-            old_categories = self.get_old_category([item.news for item in news_items])
-            old_news_items = [
+            old_categories = self.get_old_category([item.news for item in batch.items])
+            old_items = [
                 OldNewsItem.from_news_item(item, category=cat)
-                for item, cat in zip(enriched_items, old_categories)
+                for item, cat in zip(batch.items, old_categories)
             ]
-            all_old_news[agency] = old_news_items
 
-            logger.info(f'... получено [{len(news_items)}] новостей')
+            # Водяной знак агентства сдвигается отдельно, когда записаны все предшествующие микропакеты.
+            # Аренда проверяется в транзакциях основной базы, поэтому старая база пишется после неё
+            try:
+                result = await self.db_manager.insert_news_items(
+                    {batch.agency: batch.items}, advance_watermarks=False, owner=owner
+                )
+            except LeaseLost:
+                logger.warning(f'... {batch.agency}: аренда перешла к другому экземпляру, '
+                               f'{len(batch.items)} новостей не записаны')
+                return None
+            old_result = await self.db_manager.insert_old_news_items({batch.agency: old_items})
+            totals['main'] += result
+            totals['old'] += old_result
+            # Новости, отвергнутые базой, водяной знак не держат, но остаются в журнале для повторной попытки
+            failed = result.failed_urls | old_result.failed_urls
+            stored = [item for item in batch.items if item.url not in failed]
+            watermark = watermarks.persisted(batch, stored)
+            if watermark is not None:
+                try:
+                    await self.db_manager.update_watermark(batch.agency, *watermark, owner=owner)
+                except LeaseLost:
+                    logger.warning(f'... {batch.agency}: аренда перешла к другому экземпляру, '
+                                   f'водяной знак не сдвинут')
+            if self.journal is not None:
+                await self.journal.remove(stored)
+
+            logger.info(f'... {batch.agency}: записано [{result.inserted}/{len(batch.items)}] новостей')
+            return batch
+
+        pipeline = Pipeline([
+            Stage('fetch', fetch, workers=PIPELINE_FETCH_WORKERS, count=lambda batch: 1, unit='страниц'),
+            Stage('parse', parse, workers=PIPELINE_PARSE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE, reserve=True),
+            Stage('enrich', enrich, workers=PIPELINE_ENRICH_WORKERS, queue_size=PIPELINE_QUEUE_SIZE),
+            Stage('persist', persist, workers=PIPELINE_PERSIST_WORKERS, queue_size=PIPELINE_QUEUE_SIZE),
+        ], budget=ItemBudget(PIPELINE_MAX_INFLIGHT_ITEMS))
+        # Последний конвейер со статистикой этапов доступен для бенчмарков
+        self.pipeline = pipeline
+        try:
+            await pipeline.run(
+                AgencyBatch(agency=agency, last_id=last_id, position=f'[{(i + 1)}/{len(agencies)}]',
+                            resumed=resumed.get(agency, []))
+                for i, (agency, last_id) in enumerate(agencies.items())
+            )
+        finally:
+            if self.journal is not None:
+                # Новости, не дошедшие до базы из-за ошибок, возобновит следующий запуск
+                self.journal.release(owner=self)
+        pipeline.report()
 
-        total_count = sum(len(items) for items in all_news.values())
-        logger.info(f'Собрано {total_count} новостей')
+        logger.info(f'Собрано {totals["main"].total} новостей, '
+                    f'вставлено {totals["main"].inserted} / {totals["old"].inserted} (старый формат), '
+                    f'дубликатов {totals["main"].duplicates}, ошибок {totals["main"].failed}')
+        if self.dedup is not None:
+            logger.info(f'Почти-дубликатов {self.reused}: сэкономлено {self.reused * MODELS_PER_ITEM} вызовов моделей')
+        if self.cache is not None:
+            self.cache.report()
 
-        return all_news, all_old_news
+        return totals['main'], totals['old']
 
     async def enrich_news_items(self, news_items: list[NewsItem]) -> list[NewsItem]:
         """
         Обогащает новостные элементы дополнительной информацией.
         Enriches news items with additional information.
+
+        Почти-дубликаты уже обогащённых новостей получают их резюме, заголовок, категорию
+        и эмбеддинг без повторных вызовов моделей.
+        Near-duplicates of already enriched news get their resume, title, category
+        and embedding without calling the models again.
         """
-        texts = [item.news for item in news_items]
+        if self.dedup is None:
+            return await self.enrich_unique_items(news_items)
 
-        # Последовательная обработка моделями в оптимальном порядке
-        embeddings_task = self.parser.api_client.generate_embs(texts)
-        categories_task = self.parser.api_client.get_category(texts)
+        plan = self.dedup.plan(news_items)
+        if plan.unique:
+            await self.enrich_unique_items(plan.unique)
+        self.dedup.commit(plan)
+        if self.journal is not None and plan.duplicates:
+            await self.journal.complete([item for item, _ in plan.duplicates], *ENRICHMENT_STAGES)
+        self.reused += len(plan.duplicates)
+        return news_items
 
-        embeddings, categories = await asyncio.gather(
-            embeddings_task, categories_task
-        )
+    async def cached(self, model: str, texts: list[str],
+                     compute: Callable[[list[str]], Awaitable[list[Any]]]) -> list[Any]:
+        """Результаты модели с учётом кэша обогащения, если он включён."""
+        if self.cache is None:
+            return await compute(texts)
+        # Ключ кэша строится по настоящему идентификатору модели и бэкенду, а не по назначению модели
+        model_ids = await self.parser.api_client.model_ids()
+        return await self.cache.cached(model, texts, compute, model_id=model_ids.get(model, model))
 
-        # Получение резюме и заголовков
-        resumes = self.parser.api_client.generate_resumes(texts)
-        titles = self.parser.api_client.generate_headlines(texts)
+    async def enrich_unique_items(self, news_items: list[NewsItem]) -> list[NewsItem]:
+        """Вызывает модели обогащения для новостей пакета, ещё не прошедших соответствующий этап."""
+        api_client = self.parser.api_client
 
-        # Обновление всех элементов
-        for i, item in enumerate(news_items):
-            item.embedding = embeddings[i]
-            item.category = categories[i]
-            item.resume = resumes[i]
-            item.title = titles[i]
+        # Последовательная обработка моделями в оптимальном порядке; модели вызываются только для промахов кэша
+        await asyncio.gather(
+            self.enrich_stage('embed', 'embedding', 'embedding', news_items, api_client.generate_embs),
+            self.enrich_stage('categorize', 'category', 'category', news_items, api_client.get_category)
+        )
+
+        # Получение резюме и заголовков в пуле инференса, не останавливая загрузку страниц
+        await asyncio.gather(
+            self.enrich_stage('summarize', 'summary', 'resume', news_items, api_client.generate_resumes),
+            self.enrich_stage('headline', 'headline', 'title', news_items, api_client.generate_headlines)
+        )
 
         return news_items
 
+    async def enrich_stage(self, stage: str, model: str, field: str, news_items: list[NewsItem],
+                           compute: Callable[[list[str]], Awaitable[list[Any]]]):
+        """
+        Заполняет поле field результатами модели и отмечает этап stage в журнале.
+        Fills the field with the model results and marks the stage in the journal.
+        """
+        todo = self.journal.missing(news_items, stage) if self.journal is not None else news_items
+        if not todo:
+            return
+
+        async def timed(texts: list[str]) -> list[Any]:
+            started = time.perf_counter()
+            results = await compute(texts)
+            MODEL_SECONDS.labels(model).observe(time.perf_counter() - started)
+            MODEL_ITEMS.labels(model).inc(len(texts))
+            return results
+
+        results = await self.cached(model, [item.news for item in todo], timed)
+        for item, result in zip(todo, results):
+            setattr(item, field, result)
+        if self.journal is not None:
+            await self.journal.complete(todo, stage)
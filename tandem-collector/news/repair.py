@@ -0,0 +1,176 @@
+import asyncio
+import json
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+from loguru import logger
+
+from api.client import NewsAPIClient
+from db.database import DatabaseManager
+from monitoring.metrics import REPAIR_BACKLOG, REPAIR_ITEMS
+
+# Файл контрольной точки досчёта эмбеддингов (пустое значение отключает досчёт)
+EMBEDDING_REPAIR_PATH = os.getenv("EMBEDDING_REPAIR_PATH", "data/embedding_repair.json")
+# Размер страницы выборки новостей без эмбеддингов
+EMBEDDING_REPAIR_PAGE_SIZE = int(os.getenv("EMBEDDING_REPAIR_PAGE_SIZE", 500))
+# Бюджет токенов на один запрос к модели эмбеддингов (длина самого длинного текста * размер пакета);
+# модель обрезает тексты до EMBEDDING_MAX_TOKENS, длина текста в токенах оценивается по числу символов
+EMBEDDING_REPAIR_TOKEN_BUDGET = int(os.getenv("EMBEDDING_REPAIR_TOKEN_BUDGET", 8192))
+EMBEDDING_MAX_TOKENS = 512
+CHARS_PER_TOKEN = 4
+# Предельная скорость досчёта и пауза после того, как пройден весь хвост
+EMBEDDING_REPAIR_ITEMS_PER_MINUTE = float(os.getenv("EMBEDDING_REPAIR_ITEMS_PER_MINUTE", 300))
+EMBEDDING_REPAIR_IDLE_MINUTES = float(os.getenv("EMBEDDING_REPAIR_IDLE_MINUTES", 30))
+
+
+class EmbeddingRepairWorker:
+    """
+    Фоновый досчёт эмбеддингов для новостей, сохранённых без них.
+    Background repair of embeddings for news stored without them.
+
+    Новости без эмбеддингов выбираются страницами по ключу (date, url), считаются пакетами
+    в пределах бюджета токенов и дописываются в базу одной вставкой на пакет. Досчёт
+    уступает сбору новостей: пока идёт запуск сбора, новые пакеты не отправляются, а общая
+    скорость ограничена EMBEDDING_REPAIR_ITEMS_PER_MINUTE. Ключ последней пройденной страницы
+    сохраняется на диск, поэтому после перезапуска досчёт продолжается с того же места.
+    News without embeddings are read in pages keyed by (date, url), embedded in batches within
+    the token budget and written back with one insert per batch. The repair yields to news
+    collection: no batch is sent while a collection run is in progress, and the overall rate is
+    capped by EMBEDDING_REPAIR_ITEMS_PER_MINUTE. The key of the last finished page is saved to
+    disk, so after a restart the repair continues from the same place.
+    """
+
+    def __init__(self, api_client: NewsAPIClient, db_manager: DatabaseManager, path: str = EMBEDDING_REPAIR_PATH,
+                 page_size: int = EMBEDDING_REPAIR_PAGE_SIZE, token_budget: int = EMBEDDING_REPAIR_TOKEN_BUDGET,
+                 items_per_minute: float = EMBEDDING_REPAIR_ITEMS_PER_MINUTE):
+        self.api_client = api_client
+        self.db_manager = db_manager
+        self.path = Path(path)
+        self.page_size = page_size
+        self.token_budget = token_budget
+        self.items_per_minute = items_per_minute
+        self.after_date: Optional[datetime] = None
+        self.after_url: Optional[str] = None
+        self.repaired = 0
+        self._ingests = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._next_batch_at = 0.0
+        self.load_checkpoint()
+
+    def load_checkpoint(self):
+        if not self.path.exists():
+            return
+        checkpoint = json.loads(self.path.read_text())
+        self.after_date = datetime.fromisoformat(checkpoint['after_date']) if checkpoint['after_date'] else None
+        self.after_url = checkpoint['after_url']
+        self.repaired = checkpoint.get('repaired', 0)
+        logger.info(f'Досчёт эмбеддингов продолжается после {self.after_date} {self.after_url}')
+
+    def save_checkpoint(self):
+        """Атомарно записывает ключ последней пройденной страницы."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_suffix('.tmp')
+        temp.write_text(json.dumps({
+            'after_date': self.after_date.isoformat() if self.after_date else None,
+            'after_url': self.after_url,
+            'repaired': self.repaired
+        }))
+        os.replace(temp, self.path)
+
+    @asynccontextmanager
+    async def ingest(self):
+        """
+        Отмечает запуск сбора новостей: пока он идёт, досчёт не отправляет новые пакеты.
+        Marks a news collection run: while it is in progress, the repair sends no new batches.
+        """
+        self._ingests += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._ingests -= 1
+            if not self._ingests:
+                self._idle.set()
+
+    def token_batches(self, rows: list[dict[str, Any]]) -> list[list[dict[str, Any]]]:
+        """
+        Группирует строки, отсортированные по длине текста, в пакеты в пределах бюджета токенов.
+        Groups rows sorted by text length into batches that fit the token budget.
+        """
+        batches, batch = [], []
+        for row in sorted(rows, key=lambda row: len(row['news'])):
+            tokens = min(math.ceil(len(row['news']) / CHARS_PER_TOKEN), EMBEDDING_MAX_TOKENS)
+            if batch and tokens * (len(batch) + 1) > self.token_budget:
+                batches.append(batch)
+                batch = []
+            batch.append(row)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _throttle(self, items: int):
+        """Ждёт окончания сбора новостей и выдерживает предельную скорость досчёта."""
+        await self._idle.wait()
+        delay = self._next_batch_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            await self._idle.wait()
+        self._next_batch_at = time.monotonic() + items * 60 / self.items_per_minute
+
+    async def repair_page(self) -> int:
+        """
+        Досчитывает эмбеддинги одной страницы и сдвигает контрольную точку; 0 — хвост пройден.
+        Repairs the embeddings of one page and moves the checkpoint; 0 means the backlog is done.
+        """
+        rows = await self.api_client.fetch_news_without_embeddings(self.page_size, self.after_date, self.after_url)
+        if not rows:
+            return 0
+        for row in rows:
+            row['date'] = datetime.fromisoformat(row['date'])
+
+        for batch in self.token_batches(rows):
+            await self._throttle(len(batch))
+            embeddings = await self.api_client.generate_embs([row['news'] for row in batch])
+            result = await self.db_manager.insert_embeddings([
+                (row['url'], row['date'], embedding) for row, embedding in zip(batch, embeddings)
+            ])
+            self.repaired += result.inserted
+            REPAIR_ITEMS.labels('inserted').inc(result.inserted)
+            REPAIR_ITEMS.labels('skipped').inc(result.duplicates)
+
+        last = rows[-1]
+        self.after_date, self.after_url = last['date'], last['url']
+        await asyncio.to_thread(self.save_checkpoint)
+        return len(rows)
+
+    async def report(self) -> int:
+        """Логирует и возвращает число новостей, которым ещё не хватает эмбеддингов."""
+        backlog = await self.api_client.count_news_without_embeddings()
+        REPAIR_BACKLOG.set(backlog)
+        logger.info(f'Досчёт эмбеддингов: досчитано {self.repaired}, осталось {backlog} новостей без эмбеддингов')
+        return backlog
+
+    async def serve(self):
+        """
+        Досчитывает эмбеддинги до отмены, проходя хвост заново после каждой паузы.
+        Repairs embeddings until cancelled, going over the backlog again after every pause.
+        """
+        while True:
+            try:
+                if await self.report():
+                    while await self.repair_page():
+                        pass
+                    await self.report()
+                # Хвост пройден: следующий проход начнётся с самых старых новостей
+                self.after_date, self.after_url = None, None
+                await asyncio.to_thread(self.save_checkpoint)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f'Ошибка досчёта эмбеддингов: {e}')
+            await asyncio.sleep(EMBEDDING_REPAIR_IDLE_MINUTES * 60)
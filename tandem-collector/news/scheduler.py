@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+
+from db.database import DatabaseManager
+from news.leases import AgencyLeases
+
+# Режим опроса: adaptive — свой интервал для каждого агентства, cron — все агентства в начале часа
+POLL_MODE = os.getenv("POLL_MODE", "adaptive")
+# Глубина истории для оценки частоты публикаций и желаемое число новых сообщений за один опрос
+# (страница канала вмещает около 20 сообщений, остальное приходится догружать)
+POLL_HISTORY_HOURS = float(os.getenv("POLL_HISTORY_HOURS", 168))
+POLL_TARGET_NEWS = float(os.getenv("POLL_TARGET_NEWS", 10))
+# Границы интервала опроса и его прирост на каждую ступень приоритета ниже первой
+POLL_MIN_MINUTES = float(os.getenv("POLL_MIN_MINUTES", 5))
+POLL_MAX_MINUTES = float(os.getenv("POLL_MAX_MINUTES", 180))
+POLL_PRIORITY_STEP = float(os.getenv("POLL_PRIORITY_STEP", 0.5))
+# Максимум агентств в обработке одновременно, окно объединения агентств в один запуск
+# и период пересчёта интервалов по базе
+POLL_CONCURRENCY = int(os.getenv("POLL_CONCURRENCY", 16))
+POLL_COALESCE_SECONDS = float(os.getenv("POLL_COALESCE_SECONDS", 30))
+POLL_REFRESH_MINUTES = float(os.getenv("POLL_REFRESH_MINUTES", 60))
+# Пауза перед повторным пересчётом после ошибки базы; до него действует прежнее расписание
+POLL_REFRESH_RETRY_SECONDS = float(os.getenv("POLL_REFRESH_RETRY_SECONDS", 60))
+
+
+@dataclass
+class AgencyPlan:
+    """
+    Частота публикаций агентства и назначенный ему интервал опроса.
+    Agency posting rate and the polling interval assigned to it.
+    """
+    agency: str
+    news_per_hour: float
+    priority: int
+    interval: float
+
+    @staticmethod
+    def parse_priority(priority: Optional[str]) -> int:
+        """Приоритет агентства из текстовой колонки agencies.priority: 1 — наивысший."""
+        try:
+            return max(int(priority), 1)
+        except (TypeError, ValueError):
+            return 1
+
+    @classmethod
+    def from_activity(cls, agency: str, news: int, priority: Optional[str],
+                      history_hours: float = POLL_HISTORY_HOURS) -> 'AgencyPlan':
+        news_per_hour = news / history_hours
+        rank = cls.parse_priority(priority)
+        minutes = POLL_TARGET_NEWS / news_per_hour * 60 if news_per_hour else POLL_MAX_MINUTES
+        minutes *= 1 + POLL_PRIORITY_STEP * (rank - 1)
+        minutes = min(max(minutes, POLL_MIN_MINUTES), POLL_MAX_MINUTES)
+        return cls(agency=agency, news_per_hour=news_per_hour, priority=rank, interval=minutes * 60)
+
+    def phase(self) -> float:
+        """Устойчивое смещение первого опроса внутри интервала: агентства не опрашиваются разом."""
+        return zlib.crc32(self.agency.encode()) / 2 ** 32 * self.interval
+
+
+class PollingScheduler:
+    """
+    Планировщик опроса агентств с собственным интервалом для каждого агентства.
+    Agency polling scheduler with a separate interval for every agency.
+
+    Интервал обратно пропорционален частоте публикаций за POLL_HISTORY_HOURS и растёт с номером
+    приоритета; первые опросы разнесены по интервалу, а число агентств в обработке ограничено
+    общим бюджетом POLL_CONCURRENCY. Агентства, подошедшие в пределах POLL_COALESCE_SECONDS,
+    обрабатываются одним запуском, чтобы модели получали пакеты побольше.
+    The interval is inversely proportional to the posting rate over POLL_HISTORY_HOURS and grows
+    with the priority number; first polls are spread over the interval, and the number of agencies
+    in processing is capped by the global POLL_CONCURRENCY budget. Agencies due within
+    POLL_COALESCE_SECONDS are processed in one run so that the models get larger batches.
+
+    С арендой агентств в работу берутся только агентства этого экземпляра, остальные
+    проверяются снова при следующем продлении аренды.
+    With agency leases only the agencies of this instance are processed, the others are
+    checked again at the next lease renewal.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, run: Callable[[list[str]], Awaitable[None]],
+                 concurrency: int = POLL_CONCURRENCY, leases: Optional[AgencyLeases] = None):
+        self.db_manager = db_manager
+        self.run = run
+        self.leases = leases
+        self.concurrency = max(concurrency, 1)
+        self.plans: dict[str, AgencyPlan] = {}
+        self.in_flight: set[str] = set()
+        self._queue: list[tuple[float, str]] = []
+        self._refresh_at = 0.0
+        self._changed = asyncio.Event()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def refresh(self):
+        """
+        Пересчитывает интервалы по базе, сохраняя сроки уже запланированных агентств.
+        Recomputes the intervals from the database, keeping the due times of scheduled agencies.
+        """
+        activity = await self.db_manager.get_agency_activity(POLL_HISTORY_HOURS)
+        now = time.monotonic()
+        self.plans = {
+            row['agency']: AgencyPlan.from_activity(row['agency'], row['news'], row['priority'])
+            for row in activity
+        }
+        scheduled = {agency: due for due, agency in self._queue}
+        self._queue = [
+            (scheduled.get(agency, now + plan.phase()), agency)
+            for agency, plan in self.plans.items() if agency not in self.in_flight
+        ]
+        heapq.heapify(self._queue)
+        self._refresh_at = now + POLL_REFRESH_MINUTES * 60
+
+        if self.plans:
+            intervals = sorted(plan.interval / 60 for plan in self.plans.values())
+            polls_per_hour = sum(3600 / plan.interval for plan in self.plans.values())
+            logger.info(f'Интервалы опроса {len(intervals)} агентств: от {intervals[0]:.0f} до {intervals[-1]:.0f} минут, '
+                        f'медиана {intervals[len(intervals) // 2]:.0f}, в среднем {polls_per_hour:.0f} опросов в час')
+
+    def due_agencies(self, now: float) -> list[str]:
+        """Забирает из очереди подошедшие агентства в пределах свободного бюджета."""
+        batch, foreign = [], []
+        budget = self.concurrency - len(self.in_flight)
+        leased = self.leases.active if self.leases is not None else None
+        while self._queue and len(batch) < budget and self._queue[0][0] <= now + POLL_COALESCE_SECONDS:
+            agency = heapq.heappop(self._queue)[1]
+            (batch if leased is None or agency in leased else foreign).append(agency)
+        for agency in foreign:
+            heapq.heappush(self._queue, (now + self.leases.lease_seconds / 3, agency))
+        return batch
+
+    async def _process(self, agencies: list[str], started: float):
+        try:
+            await self.run(agencies)
+        except Exception as e:
+            logger.exception(f'Ошибка при обработке агентств {", ".join(agencies)}: {e}')
+        finally:
+            now = time.monotonic()
+            for agency in agencies:
+                self.in_flight.discard(agency)
+                plan = self.plans.get(agency)
+                if plan:
+                    heapq.heappush(self._queue, (max(started + plan.interval, now), agency))
+            self._changed.set()
+
+    async def _wait(self, timeout: float):
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=max(timeout, 0))
+        except asyncio.TimeoutError:
+            pass
+
+    async def serve(self):
+        """
+        Опрашивает агентства по их интервалам до отмены.
+        Polls the agencies at their intervals until cancelled.
+        """
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= self._refresh_at:
+                    try:
+                        await self.refresh()
+                    except Exception as e:
+                        # Сбой пересчёта не останавливает опрос: агентства опрашиваются по прежним интервалам
+                        logger.exception(f'Ошибка пересчёта интервалов опроса, повтор через '
+                                         f'{POLL_REFRESH_RETRY_SECONDS:.0f} секунд: {e}')
+                        self._refresh_at = now + POLL_REFRESH_RETRY_SECONDS
+
+                batch = self.due_agencies(now)
+                if batch:
+                    self.in_flight.update(batch)
+                    task = asyncio.create_task(self._process(batch, now))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                    continue
+
+                # Ждём ближайшего срока, освобождения бюджета или пересчёта интервалов
+                next_due = self._queue[0][0] if self._queue else self._refresh_at
+                if len(self.in_flight) >= self.concurrency:
+                    next_due = self._refresh_at
+                await self._wait(min(next_due, self._refresh_at) - now)
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,42 @@
+import unittest
+from pathlib import Path
+
+from news.extractors import LxmlExtractor, SoupExtractor
+
+FIXTURES = Path(__file__).parent.parent / 'benchmarks' / 'fixtures' / 'channels'
+
+
+class TestExtractorParity(unittest.TestCase):
+    def setUp(self):
+        self.soup = SoupExtractor()
+        self.lxml = LxmlExtractor()
+        self.pages = {path.stem: path.read_text(encoding='utf-8') for path in sorted(FIXTURES.glob('*.html'))}
+
+    def test_fixtures_present(self):
+        self.assertTrue(self.pages)
+
+    def test_same_messages_on_fixtures(self):
+        for agency, html in self.pages.items():
+            with self.subTest(agency=agency):
+                expected = self.soup.extract(html)
+                self.assertTrue(expected)
+                self.assertEqual(self.lxml.extract(html), expected)
+
+    def test_media_only_messages_have_no_text(self):
+        for agency, html in self.pages.items():
+            with self.subTest(agency=agency):
+                messages = self.lxml.extract(html).values()
+                self.assertTrue(all(message.text is None or message.text.strip() for message in messages))
+                self.assertTrue(all(message.url.endswith(f'/{message.message_id}') for message in messages))
+
+    def test_page_without_history(self):
+        html = '<html><body><main><div>nothing here</div></main></body></html>'
+        self.assertEqual(self.soup.extract(html), {})
+        self.assertEqual(self.lxml.extract(html), {})
+
+    def test_empty_page(self):
+        self.assertEqual(self.lxml.extract(''), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import unittest
+
+from news.extractors import RawMessage
+from news.parser import CHANNEL_PAGE_SIZE, NewsParser
+
+
+class FakeChannel:
+    """
+    История канала: ?before= отдаёт page_size самых новых сообщений старше курсора, как t.me.
+    Channel history: ?before= returns the page_size newest messages older than the cursor, like t.me.
+    """
+
+    def __init__(self, ids, page_size: int = CHANNEL_PAGE_SIZE):
+        self.ids = sorted(ids)
+        self.page_size = page_size
+        self.requests = []
+
+    async def fetch_history(self, agency: str, before: int) -> list[int]:
+        self.requests.append(before)
+        return [number for number in self.ids if number < before][-self.page_size:]
+
+
+class IdsExtractor:
+    """Страница в FakeChannel — уже список номеров сообщений."""
+    name = 'ids'
+
+    @staticmethod
+    def extract(page: list[int]) -> dict[int, RawMessage]:
+        return {number: RawMessage(number, f'https://t.me/agency/{number}') for number in page}
+
+
+class TestCatchUp(unittest.TestCase):
+    def catch_up(self, channel: FakeChannel, last_id: int, oldest_id: int) -> set[int]:
+        parser = NewsParser(api_client=None, fetcher=channel, extractor=IdsExtractor())
+        return set(asyncio.run(parser.catch_up('agency', last_id, oldest_id)))
+
+    def assert_complete(self, channel: FakeChannel, last_id: int, oldest_id: int):
+        loaded = self.catch_up(channel, last_id, oldest_id)
+        expected = {number for number in channel.ids if last_id < number < oldest_id}
+        self.assertEqual(expected - loaded, set())
+
+    def test_full_pages(self):
+        self.assert_complete(FakeChannel(range(1, 301)), last_id=100, oldest_id=281)
+
+    def test_short_pages(self):
+        # Страницы по 16 сообщений: курсоры через 20 номеров оставляли бы разрывы по 4 сообщения
+        self.assert_complete(FakeChannel(range(1, 301), page_size=16), last_id=100, oldest_id=281)
+
+    def test_deleted_messages(self):
+        # Удалённые сообщения: страница из 20 сообщений охватывает больше 20 номеров
+        ids = [number for number in range(1, 400) if number % 3]
+        self.assert_complete(FakeChannel(ids), last_id=50, oldest_id=380)
+
+    def test_start_of_channel(self):
+        channel = FakeChannel(range(30, 90))
+        self.assert_complete(channel, last_id=0, oldest_id=80)
+        self.assertLess(len(channel.requests), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()